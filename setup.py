@@ -15,7 +15,8 @@ setup(name='tap-s3-csv',
           'singer-encodings==0.1.2',
           'singer-python==5.12.1',
           'voluptuous==0.10.5',
-          'pyarrow==6.0.1',
+          'pyarrow==7.0.0',
+          'orjson==3.6.7',
           'python-dateutil',
       ],
       extras_require={
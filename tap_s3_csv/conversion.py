@@ -1,3 +1,4 @@
+import pyarrow as pa
 import singer
 
 LOGGER = singer.get_logger()
@@ -60,6 +61,53 @@ def count_sample(sample, counts, table_spec):
     return counts
 
 
+def infer_arrow(key, arrow_type, date_overrides, check_second_call=False):
+    """
+    Returns the data type of an Arrow column, matching what `infer` returns for its values
+    """
+    if pa.types.is_null(arrow_type):
+        return None
+
+    if pa.types.is_dictionary(arrow_type):
+        arrow_type = arrow_type.value_type
+
+    if pa.types.is_list(arrow_type) or pa.types.is_large_list(arrow_type) or pa.types.is_fixed_size_list(arrow_type):
+        if check_second_call:
+            LOGGER.warning(
+                'Unsupported type for "%s", List inside list is not supported hence will be treated as a string', key)
+            return 'string'
+        return 'list.' + (infer_arrow(key, arrow_type.value_type, date_overrides, True) or 'string')
+
+    if key in date_overrides:
+        return 'date-time'
+
+    if pa.types.is_struct(arrow_type):
+        return 'dict'
+
+    if pa.types.is_integer(arrow_type):
+        return 'integer'
+
+    if pa.types.is_floating(arrow_type) or pa.types.is_decimal(arrow_type):
+        return 'number'
+
+    # Timestamps, booleans, binary and the remaining types are read back as strings, as their values were
+    return 'string'
+
+
+def count_arrow_schema(schema, counts, table_spec):
+    date_overrides = table_spec.get('date_overrides', [])
+    for field in schema:
+        if field.name not in counts:
+            counts[field.name] = {}
+
+        datatype = infer_arrow(field.name, field.type, date_overrides)
+
+        if datatype is not None:
+            counts[field.name][datatype] = counts[field.name].get(datatype, 0) + 1
+
+    return counts
+
+
 def pick_datatype(counts):
     """
     If the underlying records are ONLY of type `integer`, `number`,
@@ -91,11 +139,17 @@ def pick_datatype(counts):
 
     return to_return
 
-def generate_schema(samples, table_spec):
+def generate_schema(samples, table_spec, arrow_schemas=()):
+    """
+    Returns the schema of the sampled records and of the Arrow schemas of the columns whose
+    types are known without reading their values (parquet)
+    """
     counts = {}
     for sample in samples:
         # {'name' : { 'string' : 45}}
         counts = count_sample(sample, counts, table_spec)
+    for arrow_schema in arrow_schemas:
+        counts = count_arrow_schema(arrow_schema, counts, table_spec)
     for key, value in counts.items():
         datatype = pick_datatype(value)
         if 'list.' in datatype:
@@ -1,14 +1,21 @@
+import concurrent.futures
+import functools
+import hashlib
 import itertools
+import operator
 import re
 import io
 import json
 import gzip
+import os
+import queue
+import threading
 import backoff
+import orjson
 import boto3
 import singer
-import tempfile
-import pathlib
-import os
+import pyarrow as pa
+import pyarrow.csv as pa_csv
 import pyarrow.parquet as pq
 import pytz
 
@@ -21,6 +28,7 @@ from botocore.credentials import (
 )
 from botocore.exceptions import ClientError
 from botocore.session import Session
+from boto3.s3.transfer import TransferConfig
 from singer_encodings import (
     compression,
     csv
@@ -37,7 +45,22 @@ SDC_SOURCE_BUCKET_COLUMN = "_sdc_source_bucket"
 SDC_SOURCE_FILE_COLUMN = "_sdc_source_file"
 SDC_SOURCE_LINENO_COLUMN = "_sdc_source_lineno"
 SDC_EXTRA_COLUMN = "_sdc_extra"
-skipped_files_count = 0
+S3_CLIENT_LOCK = threading.Lock()
+OTHER_FILES = ["csv","gz","jsonl","txt","parquet"]
+SAMPLING_EXTENSIONS = frozenset(OTHER_FILES + ["zip"])
+DEFAULT_DOWNLOAD_CONCURRENCY = 8
+DEFAULT_TRANSFER_CONCURRENCY = 16
+DEFAULT_DOWNLOAD_CHUNKSIZE_MB = 8
+DEFAULT_CACHE_MAX_BYTES = 10 * 1024 ** 3
+CACHED_FILE_SUFFIX = ".parquet"
+CACHE_DOWNLOAD_ATTEMPTS = 3
+PARQUET_BATCH_SIZE = 4096
+LIST_PREFETCH_PAGES = 4
+KEY_CHECK_RECORDS_COUNT = 5000
+ARROW_CSV_BLOCK_SIZE = 8 * 1024 * 1024
+CSV_HEAD_CHUNK_SIZE = 64 * 1024
+# "^" followed by literal characters (or escaped punctuation) and an optional trailing ".*"
+LITERAL_PREFIX_PATTERN = re.compile(r'\^((?:[^\\.^$*+?{}\[\]|()]|\\[^A-Za-z0-9])*)(?:\.\*)?')
 
 def retry_pattern():
     return backoff.on_exception(backoff.expo,
@@ -51,6 +74,63 @@ def log_backoff_attempt(details):
     LOGGER.info("Error detected communicating with Amazon, triggering backoff: %d try", details.get("tries"))
 
 
+class FileStats():
+    """Counts the files skipped while sampling or syncing a table."""
+    __slots__ = ('skipped',)
+
+    def __init__(self):
+        self.skipped = 0
+
+
+class S3ObjectFile(io.RawIOBase):
+    """
+    Read-only, seekable file object over an S3 object where every read is a ranged GET,
+    so readers like pyarrow only fetch the byte ranges they need.
+    """
+
+    def __init__(self, config, bucket, key):
+        super().__init__()
+        self.config = config
+        self.bucket = bucket
+        self.key = key
+        self.size = get_object_size(config, bucket, key)
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self.position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError("Invalid whence ({})".format(whence))
+        self.position = max(0, position)
+        return self.position
+
+    def read(self, size=-1):
+        end = self.size if size is None or size < 0 else min(self.size, self.position + size)
+        if end <= self.position:
+            return b''
+        data = get_object_range(self.config, self.bucket, self.key, self.position, end - 1)
+        self.position += len(data)
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
 class AssumeRoleProvider():
     METHOD = 'assume-role'
 
@@ -64,29 +144,68 @@ class AssumeRoleProvider():
         )
 
 
-@retry_pattern()
-def setup_aws_client(config):
+def get_aws_credentials(config):
     key = config.get('aws_access_key_id', os.environ.get("aws_access_key_id"))
     secret = config.get('aws_secret_access_key', os.environ.get("aws_secret_access_key"))
 
+    return key, secret
+
+
+@functools.lru_cache(maxsize=4)
+def get_aws_session(key, secret):
     return boto3.session.Session(aws_access_key_id=key, aws_secret_access_key=secret)
 
 
+@retry_pattern()
+def setup_aws_client(config):
+    # Sessions are cached but not thread-safe, they are only built under the same lock as the clients
+    with S3_CLIENT_LOCK:
+        return get_aws_session(*get_aws_credentials(config))
+
+
+@functools.lru_cache(maxsize=4)
+def get_cached_s3_client(key, secret):
+    return get_aws_session(key, secret).client('s3')
+
+
+def get_s3_client(config):
+    """
+    Returns the S3 client for the configured credentials. Clients are built once per
+    credentials and shared across threads, boto3 clients are thread-safe but sessions
+    are not, so only the creation is locked.
+    """
+    with S3_CLIENT_LOCK:
+        return get_cached_s3_client(*get_aws_credentials(config))
+
+
 def get_sampled_schema_for_table(config, table_spec):
     LOGGER.info('Sampling records to determine table schema.')
 
+    stats = FileStats()
+
     s3_files_gen = get_input_files_for_table(
         config, 
         table_spec,
         modified_since=parse(config.get('start_date')).replace(tzinfo=pytz.UTC),
-        modified_until=config.get('end_date'))
-
-    samples = [sample for sample in sample_files(config, table_spec, s3_files_gen)]
-
-    if skipped_files_count:
-        LOGGER.warning("%s files got skipped during the last sampling.",skipped_files_count)
-
-    if not samples:
+        modified_until=config.get('end_date'),
+        stats=stats,
+        extensions=SAMPLING_EXTENSIONS)
+
+    # Samples are folded into the schema as they are read, only the first one is held to detect an empty sample.
+    # The schemas of the typed parquet columns are collected aside while the samples are read
+    arrow_schemas = []
+    samples = sample_files(config, table_spec, s3_files_gen, stats=stats, arrow_schemas=arrow_schemas)
+    first_sample = next(samples, None)
+    data_schema = None
+    if first_sample is not None:
+        samples = itertools.chain([first_sample], samples)
+    if first_sample is not None or arrow_schemas:
+        data_schema = conversion.generate_schema(samples, table_spec, arrow_schemas)
+
+    if stats.skipped:
+        LOGGER.warning("%s files got skipped during the last sampling.",stats.skipped)
+
+    if data_schema is None:
         #Return empty properties for accept everything from data if no samples found
         return {
             'type': 'object',
@@ -101,112 +220,244 @@ def get_sampled_schema_for_table(config, table_spec):
             'anyOf': [{'type': 'object', 'properties': {}}, {'type': 'string'}]}}
     }
 
-    data_schema = conversion.generate_schema(samples, table_spec)
-
     return {
         'type': 'object',
         'properties': merge_dicts(data_schema, metadata_schema)
     }
 
 def merge_dicts(first, second):
-    to_return = first.copy()
-
-    for key in second:
-        if key in first:
-            if isinstance(first[key], dict) and isinstance(second[key], dict):
-                to_return[key] = merge_dicts(first[key], second[key])
+    to_return = {**first}
+
+    # Nested dicts present on both sides are merged from an explicit stack instead of recursing
+    stack = [(to_return, first, second)]
+    while stack:
+        target, left, right = stack.pop()
+        for key, value in right.items():
+            left_value = left.get(key)
+            if isinstance(left_value, dict) and isinstance(value, dict):
+                merged = {**left_value}
+                target[key] = merged
+                stack.append((merged, left_value, value))
             else:
-                to_return[key] = second[key]
-
-        else:
-            to_return[key] = second[key]
+                target[key] = value
 
     return to_return
 
 
 def get_records_for_csv(s3_path, sample_rate, iterator):
 
-    current_row = 0
     sampled_row_count = 0
 
-    for row in iterator:
+    for row in itertools.islice(iterator, 0, None, sample_rate):
 
         # Skipping the empty line of CSV.
         if len(row) == 0:
-            current_row += 1
             continue
 
-        if (current_row % sample_rate) == 0:
-            if row.get(csv.SDC_EXTRA_COLUMN):
-                row.pop(csv.SDC_EXTRA_COLUMN)
-            sampled_row_count += 1
-            if (sampled_row_count % 200) == 0:
-                LOGGER.info("Sampled %s rows from %s",
-                            sampled_row_count, s3_path)
-            yield row
+        if row.get(csv.SDC_EXTRA_COLUMN):
+            row.pop(csv.SDC_EXTRA_COLUMN)
+        sampled_row_count += 1
+        if (sampled_row_count % 200) == 0:
+            LOGGER.info("Sampled %s rows from %s",
+                        sampled_row_count, s3_path)
+        yield row
+
+    LOGGER.info("Sampled %s rows from %s", sampled_row_count, s3_path)
+
+
+def read_csv_head(file_handle, max_lines=None):
+    """
+    Reads the leading lines of a CSV stream, up to max_lines lines or one block, completed up to the
+    end of its last line. The stream is read in small chunks so no more than the lines needed are fetched.
+    """
+    chunks = []
+    head_size = 0
+    line_count = 0
+    while head_size < ARROW_CSV_BLOCK_SIZE and (max_lines is None or line_count < max_lines):
+        chunk = file_handle.read(min(CSV_HEAD_CHUNK_SIZE, ARROW_CSV_BLOCK_SIZE - head_size))
+        if not chunk:
+            return b"".join(chunks)
+        chunks.append(chunk)
+        head_size += len(chunk)
+        line_count += chunk.count(b"\n")
+
+    if not chunks[-1].endswith(b"\n"):
+        chunks.append(file_handle.readline())
+    return b"".join(chunks)
+
+
+def get_records_for_csv_with_arrow(s3_path, sample_rate, head, file_handle, table_spec):
+    """
+    Samples the leading block of a CSV file with pyarrow's C++ parser, reading every column as
+    a string like the singer_encodings parser does. If sampling goes on past that block, the
+    rest of the stream continues through the singer_encodings parser.
+
+    Returns None when Arrow cannot take the file (empty file, duplicate headers, rows with a
+    different number of values than the header...), the caller then parses it from the start.
+    """
+    delimiter = table_spec.get('delimiter', ',')
+    # NUL bytes are dropped like the singer_encodings parser does
+    head = head.replace(b'\x00', b'')
+    # A head ending inside a quoted value that spans lines can't be resumed line by line
+    if head.count(b'"') % 2:
+        return None
+    header_line = head.split(b'\n', 1)[0] + b'\n'
+    parse_options = pa_csv.ParseOptions(delimiter=delimiter, newlines_in_values=True)
+
+    try:
+        column_names = pa_csv.read_csv(io.BytesIO(header_line), parse_options=parse_options).column_names
+    except (pa.ArrowInvalid, UnicodeDecodeError):
+        return None
+
+    # Duplicate headers are moved to _sdc_extra by the singer_encodings parser only
+    if not column_names or len(set(column_names)) != len(column_names):
+        return None
+
+    # Validate key_properties and date_overrides against the header, the same way as for other files
+    csv.get_row_iterator([header_line], table_spec, None, True)
+
+    try:
+        table = pa_csv.read_csv(
+            io.BytesIO(head),
+            read_options=pa_csv.ReadOptions(block_size=ARROW_CSV_BLOCK_SIZE),
+            parse_options=parse_options,
+            convert_options=pa_csv.ConvertOptions(column_types={name: pa.string() for name in column_names}))
+    except (pa.ArrowInvalid, UnicodeDecodeError):
+        return None
+
+    if table.column_names != column_names:
+        return None
+
+    return sample_arrow_csv_table(s3_path, sample_rate, table, header_line, file_handle, table_spec)
+
+
+# pylint: disable=too-many-arguments
+def sample_arrow_csv_table(s3_path, sample_rate, table, header_line, file_handle, table_spec):
+
+    sampled_row_count = 0
+
+    for row in table.take(pa.array(range(0, table.num_rows, sample_rate), type=pa.int64())).to_pylist():
+        sampled_row_count += 1
+        if (sampled_row_count % 200) == 0:
+            LOGGER.info("Sampled %s rows from %s",
+                        sampled_row_count, s3_path)
+        yield row
+
+    # Continue past the leading block with the singer_encodings parser, keeping the sampling stride
+    iterator = csv.get_row_iterator(itertools.chain([header_line], file_handle), table_spec, None, True)
+    first_sampled_row = -table.num_rows % sample_rate
+
+    for row in itertools.islice(iterator, first_sampled_row, None, sample_rate):
+
+        # Skipping the empty line of CSV.
+        if len(row) == 0:
+            continue
 
-        current_row += 1
+        if row.get(csv.SDC_EXTRA_COLUMN):
+            row.pop(csv.SDC_EXTRA_COLUMN)
+        sampled_row_count += 1
+        if (sampled_row_count % 200) == 0:
+            LOGGER.info("Sampled %s rows from %s",
+                        sampled_row_count, s3_path)
+        yield row
 
     LOGGER.info("Sampled %s rows from %s", sampled_row_count, s3_path)
 
 
+def loads_jsonl_row(row):
+    """
+    Parses a raw JSONL line with orjson, falling back to the json module for
+    the documents orjson rejects (e.g. NaN or integers wider than 64 bits).
+    """
+    try:
+        return orjson.loads(row)
+    except orjson.JSONDecodeError:
+        return json.loads(row)
+
+
 def get_records_for_jsonl(s3_path, sample_rate, iterator):
 
-    current_row = 0
     sampled_row_count = 0
 
-    for row in iterator:
+    for row in itertools.islice(iterator, 0, None, sample_rate):
 
-        if (current_row % sample_rate) == 0:
-            decoded_row = row.decode('utf-8')
-            if decoded_row.strip():
-                row = json.loads(decoded_row)
-                # Skipping the empty json.
-                if len(row) == 0:
-                    current_row += 1
-                    continue
-            else:
-                current_row += 1
-                continue
-            sampled_row_count += 1
-            if (sampled_row_count % 200) == 0:
-                LOGGER.info("Sampled %s rows from %s",
-                            sampled_row_count, s3_path)
-            yield row
+        if not row.strip():
+            continue
+
+        row = loads_jsonl_row(row)
+        # Skipping the empty json.
+        if len(row) == 0:
+            continue
 
-        current_row += 1
+        sampled_row_count += 1
+        if (sampled_row_count % 200) == 0:
+            LOGGER.info("Sampled %s rows from %s",
+                        sampled_row_count, s3_path)
+        yield row
 
     LOGGER.info("Sampled %s rows from %s", sampled_row_count, s3_path)
 
 
-def get_records_for_parquet(s3_bucket, s3_path, sample_rate, config):
+def get_parquet_schema(s3_bucket, s3_path, config):
+    """
+    Returns the Arrow schema of a parquet file, only its footer is read from S3
+    """
+    LOGGER.info("Reading schema of %s from bucket %s", s3_path, s3_bucket)
+    parquet_file = pq.ParquetFile(S3ObjectFile(config, s3_bucket, s3_path))
+
+    if parquet_file.metadata.num_rows == 0:
+        return None
+    return parquet_file.schema_arrow
 
-    local_path = os.path.join(tempfile.gettempdir(), s3_path)
-    pathlib.Path(local_path).parent.mkdir(parents=True, exist_ok=True)
 
-    if os.path.isfile(local_path):
-        LOGGER.info(f"Skipping download, file exists: {local_path}")
-    else:
-        LOGGER.info(f"Downloading {s3_path} to {local_path}")
-        session = setup_aws_client(config)
-        session.resource("s3").Bucket(s3_bucket).download_file(s3_path, local_path)
+def is_string_column(arrow_type):
+    """
+    Returns whether an Arrow column holds strings, directly or as list items, whose values are needed
+    to infer their data type as strings of numbers are inferred as numbers
+    """
+    if pa.types.is_dictionary(arrow_type):
+        arrow_type = arrow_type.value_type
+    if pa.types.is_list(arrow_type) or pa.types.is_large_list(arrow_type) or pa.types.is_fixed_size_list(arrow_type):
+        arrow_type = arrow_type.value_type
+    return pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type)
+
+
+def get_records_for_parquet(s3_bucket, s3_path, sample_rate, config, max_records=None, columns=None):
+
+    # Read the footer and the needed row groups straight from S3 instead of downloading the file,
+    # the column chunks of each row group are fetched in coalesced ranged reads
+    LOGGER.info("Reading %s from bucket %s", s3_path, s3_bucket)
+    parquet_file = pq.ParquetFile(S3ObjectFile(config, s3_bucket, s3_path), pre_buffer=True)
+
+    # Stop decoding once enough rows were seen to fill max_records samples
+    rows_needed = max_records * sample_rate if max_records else None
 
-    parquet_file = pq.ParquetFile(local_path)
+    # Only the row groups holding the needed rows are requested, pre-buffering fetches all requested ones
+    row_groups = list(range(parquet_file.num_row_groups))
+    if rows_needed is not None:
+        row_count = 0
+        for i in row_groups:
+            row_count += parquet_file.metadata.row_group(i).num_rows
+            if row_count >= rows_needed:
+                row_groups = row_groups[:i + 1]
+                break
 
     current_row = 0
     sampled_row_count = 0
 
-    for i in range(parquet_file.num_row_groups):
-        table = parquet_file.read_row_group(i)
-        for batch in table.to_batches():
-            for row in zip(*batch.columns):
-                if (current_row % sample_rate) == 0:                                
-                    current_row += 1
-                    sampled_row_count += 1
-                    yield {
-                        table.column_names[i]: val.as_py()
-                        for i, val in enumerate(row, start=0)
-                    }
+    for batch in parquet_file.iter_batches(batch_size=PARQUET_BATCH_SIZE, row_groups=row_groups, columns=columns):
+        if rows_needed is not None:
+            if current_row >= rows_needed:
+                break
+            batch = batch.slice(0, rows_needed - current_row)
+
+        # Pick the sampled rows of the batch and convert them to dicts in a single call
+        first_sampled_row = -current_row % sample_rate
+        sampled_rows = batch.take(pa.array(range(first_sampled_row, batch.num_rows, sample_rate), type=pa.int64())).to_pylist()
+
+        current_row += batch.num_rows
+        sampled_row_count += len(sampled_rows)
+        yield from sampled_rows
 
     LOGGER.info("Sampled %s rows from %s", sampled_row_count, s3_path)
 
@@ -219,9 +470,12 @@ def check_key_properties_and_date_overrides_for_jsonl_file(table_spec, jsonl_sam
         rows += 1
         keys = record.keys()
         all_keys.update(keys)
-        if rows > 5000:
+        if rows >= KEY_CHECK_RECORDS_COUNT:
             break
 
+    check_key_properties_and_date_overrides(table_spec, all_keys, s3_path)
+
+def check_key_properties_and_date_overrides(table_spec, all_keys, s3_path):
     if table_spec.get('key_properties'):
         key_properties = set(table_spec['key_properties'])
         if not key_properties.issubset(all_keys):
@@ -234,114 +488,145 @@ def check_key_properties_and_date_overrides_for_jsonl_file(table_spec, jsonl_sam
             raise Exception('JSONL/parquet file "{}" is missing date_overrides key: {}'
                             .format(s3_path, date_overrides - all_keys))
 
-#pylint: disable=global-statement
-def sampling_gz_file(table_spec, s3_path, file_handle, sample_rate, config):
-    global skipped_files_count
+#pylint: disable=too-many-arguments
+def sampling_gz_file(table_spec, s3_bucket, s3_path, file_handle, sample_rate, config, stats, max_records=None, arrow_schemas=None):
     if s3_path.endswith(".tar.gz"):
         LOGGER.warning('Skipping "%s" file as .tar.gz extension is not supported',s3_path)
-        skipped_files_count = skipped_files_count + 1
-        return []
-
-    file_bytes = file_handle.read()
-    gz_file_obj = gzip.GzipFile(fileobj=io.BytesIO(file_bytes))
+        stats.skipped += 1
+        return
 
-    try:
-        gz_file_name = utils.get_file_name_from_gzfile(fileobj=io.BytesIO(file_bytes))
-    except AttributeError as err:
-        # If a file is compressed using gzip command with --no-name attribute,
-        # It will not return the file name and timestamp. Hence we will skip such files.
-        # We also seen this issue occur when tar is used to compress the file
-        LOGGER.warning('Skipping "%s" file as we did not get the original file name',s3_path)
-        skipped_files_count = skipped_files_count + 1
-        return []
+    # Spool the compressed stream so the header can be read before decompressing it lazily,
+    # the spool is released once the records are consumed or the generator is closed
+    with utils.spool_file(file_handle) as spooled_file:
+        try:
+            gz_file_name = utils.get_file_name_from_gzfile(fileobj=spooled_file)
+        except AttributeError as err:
+            # If a file is compressed using gzip command with --no-name attribute,
+            # It will not return the file name and timestamp. Hence we will skip such files.
+            # We also seen this issue occur when tar is used to compress the file
+            LOGGER.warning('Skipping "%s" file as we did not get the original file name',s3_path)
+            stats.skipped += 1
+            return
+
+        if not gz_file_name:
+            raise Exception('"{}" file has some error(s)'.format(s3_path))
 
-    if gz_file_name:
         if gz_file_name.endswith(".gz"):
             LOGGER.warning('Skipping "%s" file as it contains nested compression.',s3_path)
-            skipped_files_count = skipped_files_count + 1
-            return []
+            stats.skipped += 1
+            return
 
-        gz_file_extension = gz_file_name.split(".")[-1].lower()
-        return sample_file(table_spec, s3_path + "/" + gz_file_name, io.BytesIO(gz_file_obj.read()), sample_rate, gz_file_extension, config)
+        spooled_file.seek(0)
+        with gzip.GzipFile(fileobj=spooled_file, mode='rb') as gz_file_obj:
+            gz_file_extension = gz_file_name.rpartition(".")[2].lower()
+            yield from sample_file(table_spec, s3_bucket, s3_path + "/" + gz_file_name, gz_file_obj, sample_rate, gz_file_extension, config, stats, max_records, arrow_schemas)
 
-    raise Exception('"{}" file has some error(s)'.format(s3_path))
-
-def peek(iterable):
-    try:
-        first = next(iterable)
-    except StopIteration:
-        return None
-    return first, itertools.chain([first], iterable)
-
-#pylint: disable=global-statement
-def sample_file(table_spec, s3_bucket, s3_path, file_handle, sample_rate, extension, config):
-    global skipped_files_count
+#pylint: disable=too-many-arguments
+def sample_file(table_spec, s3_bucket, s3_path, file_handle, sample_rate, extension, config, stats, max_records=None, arrow_schemas=None):
+    """
+    Returns the sampled records of a file. When an arrow_schemas list is given, the parquet columns whose data
+    type is known from the footer are not read, their Arrow schema is appended to the list instead.
+    """
 
     # Check whether file is without extension or not
     if not extension or s3_path.lower() == extension:
         LOGGER.warning('"%s" without extension will not be sampled.',s3_path)
-        skipped_files_count = skipped_files_count + 1
+        stats.skipped += 1
         return []
     if extension in ["csv", "txt"]:
         # If file object read from s3 bucket file else use extracted file object from zip or gz
         file_handle = file_handle._raw_stream if hasattr(file_handle, "_raw_stream") else file_handle #pylint:disable=protected-access
+
+        if hasattr(file_handle, "read"):
+            # The header and the lines holding the max_records sampled rows, when that many are sampled
+            head = read_csv_head(file_handle, max_records * sample_rate + 1 if max_records else None)
+            csv_records = get_records_for_csv_with_arrow(s3_path, sample_rate, head, file_handle, table_spec)
+            if csv_records is not None:
+                return csv_records
+            # Arrow could not take the file, parse it from the start with the leading block put back
+            file_handle = itertools.chain(io.BytesIO(head), file_handle)
+
         iterator = csv.get_row_iterator(file_handle, table_spec, None, True)
         csv_records = []
         if iterator:
             csv_records = get_records_for_csv(s3_path, sample_rate, iterator)
         else:
             LOGGER.warning('Skipping "%s" file as it is empty',s3_path)
-            skipped_files_count = skipped_files_count + 1
+            stats.skipped += 1
         return csv_records
     if extension == "gz":
-        return sampling_gz_file(table_spec, s3_path, file_handle, sample_rate, config)
+        return sampling_gz_file(table_spec, s3_bucket, s3_path, file_handle, sample_rate, config, stats, max_records, arrow_schemas)
     if extension == "jsonl":
         # If file object read from s3 bucket file else use extracted file object from zip or gz
 
         file_handle = file_handle._raw_stream if hasattr(file_handle, "_raw_stream") else file_handle
         records = get_records_for_jsonl(s3_path, sample_rate, file_handle)
-        check_jsonl_sample_records, records = itertools.tee(records)
-        
-        result = peek(check_jsonl_sample_records)
-        if result is None:
+
+        # Materialize only the records needed for the key check and replay them ahead of the rest
+        first_records = list(itertools.islice(records, KEY_CHECK_RECORDS_COUNT))
+        if not first_records:
             LOGGER.warning('Skipping "%s" file as it is empty', s3_path)
-            skipped_files_count = skipped_files_count + 1
+            stats.skipped += 1
             return []
-        else:
-            check_jsonl_sample_records = result[1]
-        check_key_properties_and_date_overrides_for_jsonl_file(table_spec, check_jsonl_sample_records, s3_path)
-        return records
+        check_key_properties_and_date_overrides_for_jsonl_file(table_spec, first_records, s3_path)
+        return itertools.chain(first_records, records)
     if extension == "parquet":
-        records = get_records_for_parquet(s3_bucket, s3_path, sample_rate, config)
-        check_jsonl_sample_records, records = itertools.tee(records)
-        
-        result = peek(check_jsonl_sample_records)
-        if result is None:
+        parquet_schema = get_parquet_schema(s3_bucket, s3_path, config)
+        if parquet_schema is None:
             LOGGER.warning('Skipping "%s" file as it is empty', s3_path)
-            skipped_files_count = skipped_files_count + 1
+            stats.skipped += 1
             return []
-        else:
-            check_jsonl_sample_records = result[1]
-        check_key_properties_and_date_overrides_for_jsonl_file(table_spec, jsonl_sample_records, s3_path)
-        
-        return records
+        check_key_properties_and_date_overrides(table_spec, set(parquet_schema.names), s3_path)
+        if arrow_schemas is None:
+            return get_records_for_parquet(s3_bucket, s3_path, sample_rate, config, max_records)
+
+        # The types of the other columns are taken from the footer, only string columns are read
+        string_columns = [field.name for field in parquet_schema if is_string_column(field.type)]
+        arrow_schemas.append(pa.schema([field for field in parquet_schema if field.name not in string_columns]))
+        if not string_columns:
+            return []
+        return get_records_for_parquet(s3_bucket, s3_path, sample_rate, config, max_records, string_columns)
     if extension == "zip":
         LOGGER.warning('Skipping "%s" file as it contains nested compression.',s3_path)
-        skipped_files_count = skipped_files_count + 1
+        stats.skipped += 1
         return []
     LOGGER.warning('"%s" having the ".%s" extension will not be sampled.',s3_path,extension)
-    skipped_files_count = skipped_files_count + 1
+    stats.skipped += 1
     return []
 
-#pylint: disable=global-statement
+def get_sampling_file_entries(config, file_key, file_name, extension):
+    """
+    Fetches the S3 object and returns the entries it contributes to the list of files for sampling.
+    Runs on a worker thread of `get_files_to_sample`, so it must not touch module state.
+    """
+    # Only the footer of parquet files is read while sampling, no need to open the object here
+    if extension == "parquet":
+        return [{ "s3_path" : file_key , "file_handle" : None, "extension" : extension }]
+
+    file_handle = get_file_handle(config, file_key)
+
+    if extension == "zip":
+        files = compression.infer(io.BytesIO(file_handle.read()), file_name)
+
+        # Add only those extracted files which are supported by tap
+        # Prepare dictionary contains the zip file name, type i.e. unzipped and file object of extracted file
+        return [{ "type" : "unzipped", "s3_path" : file_key, "file_handle" : de_file } for de_file in files if de_file.name.rpartition(".")[2].lower() in OTHER_FILES and not de_file.name.endswith(".tar.gz") ]
+
+    # Prepare dictionary contains the s3 file path, extension of file and file object
+    return [{ "s3_path" : file_key , "file_handle" : file_handle, "extension" : extension }]
+
 def get_files_to_sample(config, s3_files, max_files):
     """
     Returns the list of files for sampling, it checks the s3_files whether any zip or gz file exists or not
     if exists then extract if and append in the list of files
 
+    The S3 objects are fetched on a pool of `s3_download_concurrency` threads, in batches no larger
+    than the number of files still needed, and the returned list keeps the order of s3_files.
+
     Args:
         config dict(): Configuration
         s3_files list(): List of S3 Bucket files
+        max_files int(): Maximum number of files to return
     Returns:
         list(dict()) : List of Files for sampling
              |_ s3_path str(): S3 Bucket File path
@@ -349,49 +634,40 @@ def get_files_to_sample(config, s3_files, max_files):
              |_ type str(): Type of file which is used for extracted file
              |_ extension str(): extension of file (for normal files only)
     """
-    global skipped_files_count
     sampled_files = []
 
-    OTHER_FILES = ["csv","gz","jsonl","txt","parquet"]
+    max_workers = max(1, int(config.get("s3_download_concurrency", DEFAULT_DOWNLOAD_CONCURRENCY)))
 
-    for s3_file in s3_files:
-        file_key = s3_file.get('key')
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = []
 
-        if len(sampled_files) >= max_files:
-            break
+        for s3_file in s3_files:
+            file_key = s3_file.get('key')
 
-        if file_key:
-            file_name = file_key.split("/").pop()
-            extension = file_name.split(".").pop().lower()
-            file_handle = get_file_handle(config, file_key)
-
-            # Check whether file is without extension or not
-            if not extension or file_name.lower() == extension:
-                LOGGER.warning('"%s" without extension will not be sampled.',file_key)
-                skipped_files_count = skipped_files_count + 1
-            elif file_key.endswith(".tar.gz"):
-                LOGGER.warning('Skipping "%s" file as .tar.gz extension is not supported', file_key)
-                skipped_files_count = skipped_files_count + 1
-            elif extension == "zip":
-                files = compression.infer(io.BytesIO(file_handle.read()), file_name)
-
-                # Add only those extracted files which are supported by tap
-                # Prepare dictionary contains the zip file name, type i.e. unzipped and file object of extracted file
-                sampled_files.extend([{ "type" : "unzipped", "s3_path" : file_key, "file_handle" : de_file } for de_file in files if de_file.name.split(".")[-1].lower() in OTHER_FILES and not de_file.name.endswith(".tar.gz") ])
-            elif extension in OTHER_FILES:
-                # Prepare dictionary contains the s3 file path, extension of file and file object
-                sampled_files.append({ "s3_path" : file_key , "file_handle" : file_handle, "extension" : extension })
-            else:
-                LOGGER.warning('"%s" having the ".%s" extension will not be sampled.',file_key,extension)
-                skipped_files_count = skipped_files_count + 1
+            if len(sampled_files) >= max_files:
+                break
+
+            # Files without a supported extension are already left out by get_input_files_for_table
+            if file_key:
+                file_name = file_key.rpartition("/")[2]
+                extension = file_name.rpartition(".")[2].lower()
+                pending.append(executor.submit(get_sampling_file_entries, config, file_key, file_name, extension))
+
+            # Collect the batch once it fills the pool or covers the files still needed
+            if pending and len(pending) >= min(max_workers, max_files - len(sampled_files)):
+                for future in pending:
+                    sampled_files.extend(future.result())
+                pending = []
+
+        for future in pending:
+            sampled_files.extend(future.result())
 
     return sampled_files
 
 
-# pylint: disable=too-many-arguments,global-statement
-def sample_files(config, table_spec, s3_files,
-                 sample_rate=5, max_records=1000, max_files=5):
-    global skipped_files_count
+# pylint: disable=too-many-arguments
+def sample_files(config, table_spec, s3_files, stats,
+                 sample_rate=5, max_records=1000, max_files=5, arrow_schemas=None):
     max_files = config.get("max_sample_files", max_files)
     LOGGER.info("Sampling files (max files: %s)", max_files)
 
@@ -407,31 +683,76 @@ def sample_files(config, table_spec, s3_files,
         if file_type and file_type == "unzipped":
             # Append the extracted file name with zip file.
             s3_path += "/" + file_handle.name
-            extension = file_handle.name.split(".")[-1].lower()
+            extension = file_handle.name.rpartition(".")[2].lower()
 
         LOGGER.info('Sampling %s (max records: %s, sample rate: %s)',
                     s3_path,
                     max_records,
                     sample_rate)
+        records = None
         try:
-            yield from itertools.islice(sample_file(table_spec, s3_bucket, s3_path, file_handle, sample_rate, extension, config), max_records)
+            records = sample_file(table_spec, s3_bucket, s3_path, file_handle, sample_rate, extension, config, stats, max_records, arrow_schemas)
+            yield from itertools.islice(records, max_records)
         except (UnicodeDecodeError,json.decoder.JSONDecodeError):
             # UnicodeDecodeError will be raised if non csv file parsed to csv parser
             # JSONDecodeError will be reaised if non JSONL file parsed to JSON parser
             # Handled both error and skipping file with wrong extension.
             LOGGER.warn("Skipping %s file as parsing failed. Verify an extension of the file.",s3_path)
-            skipped_files_count = skipped_files_count + 1
+            stats.skipped += 1
+        finally:
+            # Release the stream once enough records were sampled, rather than leaving the rest of the body pending,
+            # closing the records generator releases what it holds (e.g. the spooled gz file)
+            if hasattr(records, "close"):
+                records.close()
+            if hasattr(file_handle, "close"):
+                file_handle.close()
+
+def get_key_matcher(pattern):
+    """
+    Returns the function telling whether an S3 key matches the search_pattern. Anchored literal
+    prefixes (e.g. "^exports/my_table") are checked with str.startswith, other patterns are searched
+    with re. Raises re.error for invalid patterns.
+    """
+    literal_prefix = LITERAL_PREFIX_PATTERN.fullmatch(pattern)
+    if literal_prefix:
+        return operator.methodcaller('startswith', re.sub(r'\\(.)', r'\1', literal_prefix.group(1)))
+
+    return re.compile(pattern).search
+
+
+def has_supported_extension(key, extensions, stats):
+    """
+    Returns whether the extension of the key is one of extensions, counting the file as skipped otherwise
+    """
+    file_name = key.rpartition("/")[2]
+    extension = file_name.rpartition(".")[2].lower()
+
+    # Check whether file is without extension or not
+    if not extension or file_name.lower() == extension:
+        LOGGER.warning('"%s" without extension will not be sampled.', key)
+    elif key.endswith(".tar.gz"):
+        LOGGER.warning('Skipping "%s" file as .tar.gz extension is not supported', key)
+    elif extension not in extensions:
+        LOGGER.warning('"%s" having the ".%s" extension will not be sampled.', key, extension)
+    else:
+        return True
 
-#pylint: disable=global-statement
-def get_input_files_for_table(config, table_spec, modified_since=None, modified_until=None):
-    global skipped_files_count
+    stats.skipped += 1
+    return False
+
+def get_input_files_for_table(config, table_spec, stats, modified_since=None, modified_until=None, extensions=None):
+    """
+    Yields the keys of the bucket matching the search_pattern of the table and modified within the window.
+    When extensions is given, matching keys without one of those extensions are skipped here, before
+    anything is fetched for them.
+    """
     bucket = config['bucket']
 
     to_return = []
 
     pattern = table_spec['search_pattern']
     try:
-        matcher = re.compile(pattern)
+        search = get_key_matcher(pattern)
     except re.error as e:
         raise ValueError(
             ("search_pattern for table `{}` is not a valid regular "
@@ -442,6 +763,9 @@ def get_input_files_for_table(config, table_spec, modified_since=None, modified_
     LOGGER.info('Checking bucket "%s" for keys matching "%s"', bucket, pattern)
     LOGGER.info('Window period: since %s until %s',modified_since,modified_until)
 
+    # Parsed once here rather than for every listed object
+    modified_until_dt = parse(modified_until).replace(tzinfo=pytz.UTC) if modified_until is not None else None
+
     matched_files_count = 0
     unmatched_files_count = 0
     max_files_before_log = 30000
@@ -451,16 +775,17 @@ def get_input_files_for_table(config, table_spec, modified_since=None, modified_
 
         if s3_object['Size'] == 0:
             LOGGER.warning('Skipping matched file "%s" as it is empty', key)
-            skipped_files_count = skipped_files_count + 1
+            stats.skipped += 1
             unmatched_files_count += 1
             continue
 
-        if matcher.search(key):
+        if search(key):
             matched_files_count += 1
             if modified_since is None or modified_since < last_modified:
-                if modified_until is None or last_modified.replace(tzinfo=pytz.UTC) < parse(modified_until).replace(tzinfo=pytz.UTC):
-                    LOGGER.info('Will download key "%s" as it was last modified %s',key,last_modified)
-                    yield {'key': key, 'last_modified': last_modified}
+                if modified_until_dt is None or last_modified < modified_until_dt:
+                    if extensions is None or has_supported_extension(key, extensions, stats):
+                        LOGGER.info('Will download key "%s" as it was last modified %s',key,last_modified)
+                        yield {'key': key, 'last_modified': last_modified}
         else:
             unmatched_files_count += 1
 
@@ -479,9 +804,52 @@ def get_input_files_for_table(config, table_spec, modified_since=None, modified_
         raise Exception("No files found matching pattern {}".format(pattern))
 
 
+def prefetch_pages(pages, max_prefetched_pages=LIST_PREFETCH_PAGES):
+    """
+    Yields from pages while a background thread already requests the following ones,
+    so the next ListObjectsV2 round trip overlaps with the processing of the current page.
+    """
+    page_queue = queue.Queue(maxsize=max_prefetched_pages)
+    stop = threading.Event()
+    end_of_pages = object()
+
+    def put(item):
+        # Give up once the consumer is gone so the thread does not block on a full queue
+        while not stop.is_set():
+            try:
+                page_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def fetch_pages():
+        try:
+            for page in pages:
+                if not put((page, None)):
+                    return
+        except Exception as err:
+            put((None, err))
+            return
+        put((end_of_pages, None))
+
+    thread = threading.Thread(target=fetch_pages, daemon=True)
+    thread.start()
+    try:
+        while True:
+            page, err = page_queue.get()
+            if err is not None:
+                raise err
+            if page is end_of_pages:
+                return
+            yield page
+    finally:
+        stop.set()
+
+
 @retry_pattern()
 def list_files_in_bucket(bucket, search_prefix=None, config=None):
-    s3_client = setup_aws_client(config).client('s3')
+    s3_client = get_s3_client(config)
 
     s3_object_count = 0
 
@@ -496,7 +864,7 @@ def list_files_in_bucket(bucket, search_prefix=None, config=None):
 
     paginator = s3_client.get_paginator('list_objects_v2')
     pages = 0
-    for page in paginator.paginate(**args):
+    for page in prefetch_pages(paginator.paginate(**args)):
         pages += 1
         LOGGER.debug("On page %s", pages)
         s3_object_count += len(page['Contents'])
@@ -508,11 +876,96 @@ def list_files_in_bucket(bucket, search_prefix=None, config=None):
         LOGGER.warning('Found no files for bucket "%s" that match prefix "%s"', bucket, search_prefix)
 
 
+@retry_pattern()
+def get_object_size(config, s3_bucket, s3_path):
+    s3_client = get_s3_client(config)
+
+    return s3_client.head_object(Bucket=s3_bucket, Key=s3_path)['ContentLength']
+
+
+@retry_pattern()
+def get_object_etag(config, s3_bucket, s3_path):
+    s3_client = get_s3_client(config)
+
+    return s3_client.head_object(Bucket=s3_bucket, Key=s3_path)['ETag'].strip('"')
+
+
+@retry_pattern()
+def get_object_range(config, s3_bucket, s3_path, start, end):
+    s3_client = get_s3_client(config)
+
+    return s3_client.get_object(Bucket=s3_bucket, Key=s3_path, Range='bytes={}-{}'.format(start, end))['Body'].read()
+
+
 @retry_pattern()
 def get_file_handle(config, s3_path):
     bucket = config['bucket']
-    s3_client = setup_aws_client(config).resource('s3')
+    s3_client = get_s3_client(config)
+
+    return s3_client.get_object(Bucket=bucket, Key=s3_path)['Body']
+
+
+def get_transfer_config(config):
+    """
+    Returns the TransferConfig used for downloads, objects above the chunk size
+    are fetched as concurrent ranged GETs instead of a single stream.
+    """
+    chunksize = int(config.get("s3_download_chunksize_mb", DEFAULT_DOWNLOAD_CHUNKSIZE_MB)) * 1024 * 1024
+    return TransferConfig(multipart_threshold=chunksize,
+                          multipart_chunksize=chunksize,
+                          max_concurrency=max(1, int(config.get("s3_transfer_concurrency", DEFAULT_TRANSFER_CONCURRENCY))),
+                          use_threads=True)
+
+
+@retry_pattern()
+def download_file(config, s3_bucket, s3_path, local_path):
+    s3_client = get_s3_client(config)
+
+    s3_client.download_file(s3_bucket, s3_path, local_path, Config=get_transfer_config(config))
+
+
+def get_cached_file(config, s3_bucket, s3_path):
+    """
+    Returns the local path of the S3 object, downloading it into the local cache unless a copy of the
+    same ETag is already there. Only used when `local_cache_dir` is configured: the cache outlives
+    the run and the least recently used files are evicted once it grows above `cache_max_bytes`.
+    """
+    cache_dir = os.path.expanduser(config["local_cache_dir"])
+    etag = get_object_etag(config, s3_bucket, s3_path)
+
+    for _ in range(CACHE_DOWNLOAD_ATTEMPTS):
+        # Keyed by the ETag, so an object changed in S3 is never served from a stale copy
+        cache_key = hashlib.sha256("{}/{}".format(s3_bucket, etag).encode("utf-8")).hexdigest()
+        local_path = os.path.join(cache_dir, cache_key + CACHED_FILE_SUFFIX)
+
+        if os.path.isfile(local_path):
+            LOGGER.info("Using cached copy of %s: %s", s3_path, local_path)
+            # Mark the file as recently used for the eviction
+            os.utime(local_path)
+            return local_path
+
+        os.makedirs(cache_dir, exist_ok=True)
+        LOGGER.info("Downloading %s to %s", s3_path, local_path)
+
+        # Downloaded next to its final path and renamed, so a partial download is never picked up from the cache
+        partial_path = "{}.{}.part".format(local_path, os.getpid())
+        try:
+            download_file(config, s3_bucket, s3_path, partial_path)
+
+            # The download is not pinned to the ETag, it is only cached if the object did not change meanwhile
+            downloaded_etag = get_object_etag(config, s3_bucket, s3_path)
+            if downloaded_etag == etag:
+                os.replace(partial_path, local_path)
+        finally:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+
+        if downloaded_etag == etag:
+            utils.evict_lru_files(cache_dir, int(config.get("cache_max_bytes", DEFAULT_CACHE_MAX_BYTES)),
+                                  keep=local_path, suffix=CACHED_FILE_SUFFIX)
+            return local_path
+
+        LOGGER.warning("%s changed while it was downloaded, downloading it again", s3_path)
+        etag = downloaded_etag
 
-    s3_bucket = s3_client.Bucket(bucket)
-    s3_object = s3_bucket.Object(s3_path)
-    return s3_object.get()['Body']
+    raise Exception('"{}" kept changing while it was downloaded'.format(s3_path))
@@ -33,8 +33,10 @@ def sync_stream(config, state, table_spec, stream):
     LOGGER.info('Syncing table "%s".', table_name)
     LOGGER.info('Getting files modified since %s.', modified_since)
 
+    stats = s3.FileStats()
+
     s3_files = s3.get_input_files_for_table(
-        config, table_spec, modified_since, modified_until=config.get('end_date'))
+        config, table_spec, stats, modified_since, modified_until=config.get('end_date'))
 
     records_streamed = 0
 
@@ -44,33 +46,33 @@ def sync_stream(config, state, table_spec, stream):
     # based on anything else then we could just sync files as we see them.
     for s3_file in sorted(s3_files, key=lambda item: item['last_modified']):
         records_streamed += sync_table_file(
-            config, s3_file['key'], table_spec, stream)
+            config, s3_file['key'], table_spec, stream, stats)
 
         state = singer.write_bookmark(state, table_name, 'modified_since', s3_file['last_modified'].isoformat())
         singer.write_state(state)
 
-    if s3.skipped_files_count:
-        LOGGER.warn("%s files got skipped during the last sync.",s3.skipped_files_count)
+    if stats.skipped:
+        LOGGER.warn("%s files got skipped during the last sync.",stats.skipped)
 
     LOGGER.info('Wrote %s records for table "%s".', records_streamed, table_name)
 
     return records_streamed
 
 
-def sync_table_file(config, s3_path, table_spec, stream):
+def sync_table_file(config, s3_path, table_spec, stream, stats):
 
-    extension = s3_path.split(".")[-1].lower()
+    extension = s3_path.rpartition(".")[2].lower()
 
     # Check whether file is without extension or not
     if not extension or s3_path.lower() == extension:
         LOGGER.warning('"%s" without extension will not be synced.',s3_path)
-        s3.skipped_files_count = s3.skipped_files_count + 1
+        stats.skipped += 1
         return 0
     try:
         if extension == "zip":
-            return sync_compressed_file(config, s3_path, table_spec, stream)
+            return sync_compressed_file(config, s3_path, table_spec, stream, stats)
         if extension in ["csv", "gz", "jsonl", "txt", "parquet"]:
-            return handle_file(config, s3_path, table_spec, stream, extension)
+            return handle_file(config, s3_path, table_spec, stream, extension, stats)
         LOGGER.warning('"%s" having the ".%s" extension will not be synced.',s3_path,extension)
         raise Exception(f"Extension {extension} not supported.")
     except (UnicodeDecodeError,json.decoder.JSONDecodeError):
@@ -78,29 +80,28 @@ def sync_table_file(config, s3_path, table_spec, stream):
         # JSONDecodeError will be raised if non JSONL file passed to JSON parser
         # Handled both error and skipping file with wrong extension.
         LOGGER.warning("Skipping %s file as parsing failed. Verify an extension of the file.",s3_path)
-        s3.skipped_files_count = s3.skipped_files_count + 1
+        stats.skipped += 1
     return 0
 
 
 # pylint: disable=too-many-arguments
-def handle_file(config, s3_path, table_spec, stream, extension, file_handler = None):
+def handle_file(config, s3_path, table_spec, stream, extension, stats, file_handler = None):
     """
     Used to sync normal supported files
     """
-
     # Check whether file is without extension or not
     if not extension or s3_path.lower() == extension:
         LOGGER.warning('"%s" without extension will not be synced.',s3_path)
-        s3.skipped_files_count = s3.skipped_files_count + 1
+        stats.skipped += 1
         return 0
     if extension == "gz":
-        return sync_gz_file(config, s3_path, table_spec, stream, file_handler)
+        return sync_gz_file(config, s3_path, table_spec, stream, file_handler, stats)
 
     if extension in ["csv", "txt"]:
 
         # If file is extracted from zip or gz use file object else get file object from s3 bucket
         file_handle = file_handler if file_handler else s3.get_file_handle(config, s3_path)._raw_stream #pylint:disable=protected-access
-        return sync_csv_file(config, file_handle, s3_path, table_spec, stream)
+        return sync_csv_file(config, file_handle, s3_path, table_spec, stream, stats)
 
     if extension == "jsonl":
 
@@ -109,7 +110,7 @@ def handle_file(config, s3_path, table_spec, stream, extension, file_handler = N
         records =  sync_jsonl_file(config, file_handle, s3_path, table_spec, stream)
         if records == 0:
             # Only space isn't the valid JSON but it is a valid CSV header hence skipping the jsonl file with only space.
-            s3.skipped_files_count = s3.skipped_files_count + 1
+            stats.skipped += 1
             LOGGER.warning('Skipping "%s" file as it is empty', s3_path)
         return records
 
@@ -119,57 +120,60 @@ def handle_file(config, s3_path, table_spec, stream, extension, file_handler = N
         records =  sync_parquet_file(config, None, s3_path, table_spec, stream)
         if records == 0:
             # Only space isn't the valid JSON but it is a valid CSV header hence skipping the jsonl file with only space.
-            s3.skipped_files_count = s3.skipped_files_count + 1
+            stats.skipped += 1
             LOGGER.warning('Skipping "%s" file as it is empty', s3_path)
         return records
 
     if extension == "zip":
         LOGGER.warning('Skipping "%s" file as it contains nested compression.',s3_path)
-        s3.skipped_files_count = s3.skipped_files_count + 1
+        stats.skipped += 1
         return 0
 
     LOGGER.warning('"%s" having the ".%s" extension will not be synced.',s3_path,extension)
-    s3.skipped_files_count = s3.skipped_files_count + 1
+    stats.skipped += 1
     return 0
 
 
-def sync_gz_file(config, s3_path, table_spec, stream, file_handler):
+# pylint: disable=too-many-arguments
+def sync_gz_file(config, s3_path, table_spec, stream, file_handler, stats):
     if s3_path.endswith(".tar.gz"):
         LOGGER.warning('Skipping "%s" file as .tar.gz extension is not supported',s3_path)
-        s3.skipped_files_count = s3.skipped_files_count + 1
+        stats.skipped += 1
         return 0
 
     # If file is extracted from zip use file object else get file object from s3 bucket
     file_object = file_handler if file_handler else s3.get_file_handle(config, s3_path)
 
-    file_bytes = file_object.read()
-    gz_file_obj = gzip.GzipFile(fileobj=io.BytesIO(file_bytes))
+    # Spool the compressed stream so the header can be read before decompressing it lazily
+    with utils.spool_file(file_object) as spooled_file:
+
+        # pylint: disable=duplicate-code
+        try:
+            gz_file_name = utils.get_file_name_from_gzfile(fileobj=spooled_file)
+        except AttributeError as err:
+            # If a file is compressed using gzip command with --no-name attribute,
+            # It will not return the file name and timestamp. Hence we will skip such files.
+            # We also seen this issue occur when tar is used to compress the file
+            LOGGER.warning('Skipping "%s" file as we did not get the original file name',s3_path)
+            stats.skipped += 1
+            return 0
 
-    # pylint: disable=duplicate-code
-    try:
-        gz_file_name = utils.get_file_name_from_gzfile(fileobj=io.BytesIO(file_bytes))
-    except AttributeError as err:
-        # If a file is compressed using gzip command with --no-name attribute,
-        # It will not return the file name and timestamp. Hence we will skip such files.
-        # We also seen this issue occur when tar is used to compress the file
-        LOGGER.warning('Skipping "%s" file as we did not get the original file name',s3_path)
-        s3.skipped_files_count = s3.skipped_files_count + 1
-        return 0
+        if gz_file_name:
 
-    if gz_file_name:
+            if gz_file_name.endswith(".gz"):
+                LOGGER.warning('Skipping "%s" file as it contains nested compression.',s3_path)
+                stats.skipped += 1
+                return 0
 
-        if gz_file_name.endswith(".gz"):
-            LOGGER.warning('Skipping "%s" file as it contains nested compression.',s3_path)
-            s3.skipped_files_count = s3.skipped_files_count + 1
-            return 0
-
-        gz_file_extension = gz_file_name.split(".")[-1].lower()
-        return handle_file(config, s3_path + "/" + gz_file_name, table_spec, stream, gz_file_extension, io.BytesIO(gz_file_obj.read()))
+            spooled_file.seek(0)
+            with gzip.GzipFile(fileobj=spooled_file, mode='rb') as gz_file_obj:
+                gz_file_extension = gz_file_name.rpartition(".")[2].lower()
+                return handle_file(config, s3_path + "/" + gz_file_name, table_spec, stream, gz_file_extension, stats, gz_file_obj)
 
     raise Exception('"{}" file has some error(s)'.format(s3_path))
 
 
-def sync_compressed_file(config, s3_path, table_spec, stream):
+def sync_compressed_file(config, s3_path, table_spec, stream, stats):
     LOGGER.info('Syncing Compressed file "%s".', s3_path)
 
     records_streamed = 0
@@ -178,18 +182,19 @@ def sync_compressed_file(config, s3_path, table_spec, stream):
     decompressed_files = compression.infer(io.BytesIO(s3_file_handle.read()), s3_path)
 
     for decompressed_file in decompressed_files:
-        extension = decompressed_file.name.split(".")[-1].lower()
+        extension = decompressed_file.name.rpartition(".")[2].lower()
 
         if extension in ["csv", "jsonl", "gz", "txt", "parquet"]:
             # Append the extracted file name with zip file.
             s3_file_path = s3_path + "/" + decompressed_file.name
 
-            records_streamed += handle_file(config, s3_file_path, table_spec, stream, extension, file_handler=decompressed_file)
+            records_streamed += handle_file(config, s3_file_path, table_spec, stream, extension, stats, file_handler=decompressed_file)
 
     return records_streamed
 
 
-def sync_csv_file(config, file_handle, s3_path, table_spec, stream):
+# pylint: disable=too-many-arguments
+def sync_csv_file(config, file_handle, s3_path, table_spec, stream, stats):
     LOGGER.info('Syncing file "%s".', s3_path)
 
     bucket = config['bucket']
@@ -235,7 +240,7 @@ def sync_csv_file(config, file_handle, s3_path, table_spec, stream):
             records_synced += 1
     else:
         LOGGER.warning('Skipping "%s" file as it is empty',s3_path)
-        s3.skipped_files_count = s3.skipped_files_count + 1
+        stats.skipped += 1
 
     return records_synced
 
@@ -299,59 +304,60 @@ def sync_parquet_file(config, iterator, s3_path, table_spec, stream):
     bucket = config['bucket']
     table_name = table_spec['table_name']
 
-    local_path = os.path.join(tempfile.gettempdir(), s3_path)
-    pathlib.Path(local_path).parent.mkdir(parents=True, exist_ok=True)
-
-    if os.path.isfile(local_path):
-        LOGGER.info(f"Skipping download, file exists: {local_path}")
+    # The file is kept in the local cache when one is configured, otherwise it is removed after the sync
+    use_cache = bool(config.get("local_cache_dir"))
+    if use_cache:
+        local_path = s3.get_cached_file(config, bucket, s3_path)
     else:
-        LOGGER.info(f"Downloading {s3_path} to {local_path}")
-        session = s3.setup_aws_client(config)
-        session.resource("s3").Bucket(config["bucket"]).download_file(s3_path, local_path)
+        local_path = os.path.join(tempfile.gettempdir(), s3_path)
+        pathlib.Path(local_path).parent.mkdir(parents=True, exist_ok=True)
 
-    parquet_file = pq.ParquetFile(local_path)
+        if os.path.isfile(local_path):
+            LOGGER.info(f"Skipping download, file exists: {local_path}")
+        else:
+            LOGGER.info(f"Downloading {s3_path} to {local_path}")
+            s3.download_file(config, bucket, s3_path, local_path)
+
+    # Memory-mapped, so the row groups are read through the page cache without another copy, and
+    # streamed in batches with the column chunks of each row group fetched in coalesced reads
+    parquet_file = pq.ParquetFile(local_path, memory_map=True, pre_buffer=True)
     records_synced = 0
 
-    for i in range(parquet_file.num_row_groups):
-        table = parquet_file.read_row_group(i)
-        for batch in table.to_batches():
-            for row in zip(*batch.columns):
-                custom_columns = {
-                    s3.SDC_SOURCE_BUCKET_COLUMN: bucket,
-                    s3.SDC_SOURCE_FILE_COLUMN: s3_path,
+    for batch in parquet_file.iter_batches(batch_size=s3.PARQUET_BATCH_SIZE):
+        for raw_rec in batch.to_pylist():
+            custom_columns = {
+                s3.SDC_SOURCE_BUCKET_COLUMN: bucket,
+                s3.SDC_SOURCE_FILE_COLUMN: s3_path,
 
-                    # index zero and then starting from 1
-                    s3.SDC_SOURCE_LINENO_COLUMN: records_synced + 1
-                }
-                raw_rec = {
-                    table.column_names[i]: val.as_py()
-                    for i, val in enumerate(row, start=0)
+                # index zero and then starting from 1
+                s3.SDC_SOURCE_LINENO_COLUMN: records_synced + 1
+            }
+            rec = {**raw_rec, **custom_columns}
+
+            with Transformer() as transformer:
+                to_write = transformer.transform(rec, stream['schema'], metadata.to_map(stream['metadata']))
+            # collecting the value which was removed in transform to add those in _sdc_extra
+            value = [ {field:rec[field]} for field in set(rec) - set(to_write) ]
+
+            if value:
+                LOGGER.warning(
+                    "\"%s\" is not found in catalog and its value will be stored in the \"_sdc_extra\" field.", value)
+                extra_data = {
+                    s3.SDC_EXTRA_COLUMN: value
                 }
-                rec = {**raw_rec, **custom_columns}
-
-                with Transformer() as transformer:
-                    to_write = transformer.transform(rec, stream['schema'], metadata.to_map(stream['metadata']))
-                # collecting the value which was removed in transform to add those in _sdc_extra
-                value = [ {field:rec[field]} for field in set(rec) - set(to_write) ]
-
-                if value:
-                    LOGGER.warning(
-                        "\"%s\" is not found in catalog and its value will be stored in the \"_sdc_extra\" field.", value)
-                    extra_data = {
-                        s3.SDC_EXTRA_COLUMN: value
-                    }
-                    update_to_write = {**to_write,**extra_data}
-                else:
-                    update_to_write = to_write
-
-                # Transform again to validate _sdc_extra value.
-                with Transformer() as transformer:
-                    update_to_write = transformer.transform(update_to_write, stream['schema'], metadata.to_map(stream['metadata']))
-
-                singer.write_record(table_name, update_to_write)
-                records_synced += 1
-
-    LOGGER.info(f"Cleaning file: {local_path}")
-    os.remove(local_path)
+                update_to_write = {**to_write,**extra_data}
+            else:
+                update_to_write = to_write
+
+            # Transform again to validate _sdc_extra value.
+            with Transformer() as transformer:
+                update_to_write = transformer.transform(update_to_write, stream['schema'], metadata.to_map(stream['metadata']))
+
+            singer.write_record(table_name, update_to_write)
+            records_synced += 1
+
+    if not use_cache:
+        LOGGER.info(f"Cleaning file: {local_path}")
+        os.remove(local_path)
 
     return records_synced
@@ -1,10 +1,49 @@
+import contextlib
 import gzip
+import os
+import shutil
 import struct
+import tempfile
+
+# Streams up to this size are spooled in memory, larger ones roll over to a temporary file
+SPOOL_MAX_SIZE = 16 * 1024 * 1024
+
+
+@contextlib.contextmanager
+def spool_file(fileobj, max_size=SPOOL_MAX_SIZE):
+    """Copying a (possibly non-seekable) stream into a seekable SpooledTemporaryFile, closed on exit."""
+    with tempfile.SpooledTemporaryFile(max_size=max_size) as spooled_file:
+        shutil.copyfileobj(fileobj, spooled_file)
+        spooled_file.seek(0)
+        yield spooled_file
+
+
+def evict_lru_files(directory, max_bytes, keep=None, suffix=""):
+    """Removing the least recently used files ending with suffix until the directory holds at most max_bytes."""
+    entries = []
+    with os.scandir(directory) as scanned:
+        for entry in scanned:
+            if entry.is_file() and entry.name.endswith(suffix):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total_bytes = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_bytes <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # Already evicted by another run sharing the directory
+            pass
+        total_bytes -= size
 
 
 def get_file_name_from_gzfile(filename=None, fileobj=None):
     """Reading headers of GzipFile and returning filename."""
-    _gz = gzip.GzipFile(filename=filename,fileobj=fileobj)
+    _gz = gzip.GzipFile(filename=filename,mode='rb',fileobj=fileobj)
     _fp = _gz.fileobj
 
     # the magic 2 bytes: if 0x1f 0x8b (037 213 in octal)
@@ -5,6 +5,7 @@ import io
 import gzip
 import singer
 import zipfile
+from tempfile import SpooledTemporaryFile
 from unittest import mock
 from tap_s3_csv import s3
 from singer_encodings import csv
@@ -104,6 +105,40 @@ class TestCompressedFileSupport(unittest.TestCase):
         self.assertEquals(max_files, len(files))
 
 
+    @mock.patch("tap_s3_csv.s3.get_file_handle")
+    def test_concurrent_fetch_keeps_order_of_files(self, mocked_get_file_handle):
+        config = {"s3_download_concurrency": 2}
+        max_files = 3
+        sample_keys = [
+            { "key" : "a.jsonl" },
+            { "key" : "b.csv" },
+            { "key" : "c.txt" },
+            { "key" : "d.jsonl" },
+        ]
+
+        mocked_get_file_handle.side_effect = lambda config, s3_path: s3_path
+
+        files = s3.get_files_to_sample(config, sample_keys, max_files)
+
+        self.assertListEqual(["a.jsonl", "b.csv", "c.txt"], [file["s3_path"] for file in files])
+        self.assertEqual(3, mocked_get_file_handle.call_count)
+
+
+    @mock.patch("tap_s3_csv.s3.list_files_in_bucket")
+    def test_skipped_files_are_counted_in_stats(self, mocked_list_files_in_bucket):
+        config = {"bucket": "bucket_name"}
+        table_spec = {"table_name": "test_table", "search_pattern": ".*"}
+        stats = s3.FileStats()
+        mocked_list_files_in_bucket.return_value = [
+            { "Key" : key, "LastModified" : None, "Size" : 10 } for key in ["a.exe", "b.tar.gz", "c", "d.csv"]
+        ]
+
+        files = list(s3.get_input_files_for_table(config, table_spec, stats=stats, extensions=s3.SAMPLING_EXTENSIONS))
+
+        self.assertEqual(["d.csv"], [file["key"] for file in files])
+        self.assertEqual(3, stats.skipped)
+
+
     @mock.patch("tap_s3_csv.s3.get_file_handle")
     def test_non_compress_file_jsonl(self, mocked_get_file_handle):
         config = {}
@@ -131,7 +166,7 @@ class TestCompressedFileSupport(unittest.TestCase):
             {"columnA" : "1", "columnB" : "2", "columnC" : "3"}
         ]
 
-        actual_output = [sample for sample in s3.sample_file(table_spec, s3_path, file_handle, sample_rate, extension)]
+        actual_output = [sample for sample in s3.sample_file(table_spec, "bucket", s3_path, file_handle, sample_rate, extension, {}, s3.FileStats())]
 
         self.assertEqual(expected_output, actual_output)
 
@@ -174,11 +209,31 @@ class TestCompressedFileSupport(unittest.TestCase):
                 {'id': '1', 'location': 'Eldon Base for stackable storage shelf, platinum', 'name': 'Muhammed MacIntyre', 'count': '3', 'decimal1': '-213.25', 'decimal2': '38.94', 'decimal3': '35', 'category': 'Nunavut', 'point': 'Storage & Organization'}
             ]
 
-            actual_output = [sample for sample in s3.sample_file(table_spec, s3_path, file_handle, sample_rate, extension)]
+            actual_output = [sample for sample in s3.sample_file(table_spec, "bucket", s3_path, file_handle, sample_rate, extension, {}, s3.FileStats())]
 
             self.assertEqual(expected_output, actual_output)
 
 
+    @mock.patch("tap_s3_csv.s3.get_files_to_sample")
+    def test_spooled_gz_file_is_closed_after_sampling(self, mocked_get_files_to_sample):
+        gz_file_path = get_resources_path("sample_compressed_gz_file_with_json_file_2_records.gz",JSONL_FOLDER_PATH)
+        spooled_files = []
+
+        def spooled_temporary_file(*args, **kwargs):
+            spooled_files.append(SpooledTemporaryFile(*args, **kwargs))
+            return spooled_files[-1]
+
+        with open(gz_file_path, "rb") as file_handle, \
+                mock.patch("tap_s3_csv.utils.tempfile.SpooledTemporaryFile", side_effect=spooled_temporary_file):
+            mocked_get_files_to_sample.return_value = [{"s3_path": "sample.gz", "file_handle": file_handle, "extension": "gz"}]
+
+            samples = list(s3.sample_files({"bucket": "bucket_name"}, {}, [], s3.FileStats(), max_records=1))
+
+        self.assertEqual(1, len(samples))
+        self.assertEqual(1, len(spooled_files))
+        self.assertTrue(spooled_files[0].closed)
+
+
     def test_gz_samples_for_jsonl(self):
         gz_file_path = get_resources_path("sample_compressed_gz_file_with_json_file_2_records.gz",JSONL_FOLDER_PATH)
 
@@ -192,7 +247,7 @@ class TestCompressedFileSupport(unittest.TestCase):
             expected_output = [
                 {"id":1,"name":"abc","semester":1,"created_at":"2021-05-21"}]
 
-            actual_output = [sample for sample in s3.sample_file(table_spec, s3_path, file_handle, sample_rate, extension)]
+            actual_output = [sample for sample in s3.sample_file(table_spec, "bucket", s3_path, file_handle, sample_rate, extension, {}, s3.FileStats())]
 
             self.assertEqual(expected_output, actual_output)
 
@@ -214,9 +269,9 @@ class TestCompressedFileSupport(unittest.TestCase):
         table_spec = {}
         stream = {}
         s3_path = "csv_files.zip"
-        sync.sync_table_file(config, s3_path, table_spec, stream)
+        sync.sync_table_file(config, s3_path, table_spec, stream, s3.FileStats())
 
-        mocked_sync_compressed_file.assert_called_with(config, s3_path, table_spec, stream)
+        mocked_sync_compressed_file.assert_called_with(config, s3_path, table_spec, stream, mock.ANY)
 
 
     @mock.patch("tap_s3_csv.sync.handle_file")
@@ -226,9 +281,9 @@ class TestCompressedFileSupport(unittest.TestCase):
         table_spec = {}
         stream = {}
         s3_path = "csv_files.gz"
-        sync.sync_table_file(config, s3_path, table_spec, stream)
+        sync.sync_table_file(config, s3_path, table_spec, stream, s3.FileStats())
 
-        mocked_handle_file.assert_called_with(config, s3_path, table_spec, stream, "gz")
+        mocked_handle_file.assert_called_with(config, s3_path, table_spec, stream, "gz", mock.ANY)
 
 
 @mock.patch("tap_s3_csv.sync.LOGGER.warning")
@@ -243,7 +298,7 @@ class TestUnsupportedFiles(unittest.TestCase):
 
             return [{'s3_path': 'unittest_compressed_files/gz_stored_as_csv.csv', 'file_handle': file_handle, 'extension': 'csv'}]
 
-    def mock_csv_sample_file(table_spec, s3_path, file_handle, sample_rate, extension):
+    def mock_csv_sample_file(*args, **kwargs):
         raise UnicodeDecodeError("test",b"'utf-8' codec can't decode byte 0x8b in position 1: invalid start byte",42, 43, 'the universe and everything else')
     
     def mock_get_files_to_sample_jsonl(config, s3_files, max_files):
@@ -255,21 +310,18 @@ class TestUnsupportedFiles(unittest.TestCase):
 
             return [{'s3_path': 'unittest_compressed_files/gz_stored_as_jsonl.jsonl', 'file_handle': file_handle, 'extension': 'jsonl'}]
 
-    def mock_jsonl_sample_file(table_spec, s3_path, file_handle, sample_rate, extension):
+    def mock_jsonl_sample_file(*args, **kwargs):
         # To raise json decoder error.
         return json.loads(b"'{'}")
 
-    @mock.patch("tap_s3_csv.s3.get_file_handle")
-    def test_get_files_for_samples_of_tar_gz_file_samples(self, mocked_file_handle, mocked_logger):
-        config = {}
-        sample_key = { "key" : "unittest_compressed_files/sample_compressed.tar.gz" }
-        mocked_file_handle.return_value = None
-
-        actual_output = s3.get_files_to_sample(config, [sample_key], 5)
+    def test_get_files_for_samples_of_tar_gz_file_samples(self, mocked_logger):
+        stats = s3.FileStats()
+        sample_key = "unittest_compressed_files/sample_compressed.tar.gz"
 
-        self.assertEquals(0,len(actual_output))
+        self.assertFalse(s3.has_supported_extension(sample_key, s3.SAMPLING_EXTENSIONS, stats))
+        self.assertEqual(1, stats.skipped)
 
-        mocked_logger.assert_called_with('Skipping "%s" file as .tar.gz extension is not supported',sample_key["key"])
+        mocked_logger.assert_called_with('Skipping "%s" file as .tar.gz extension is not supported',sample_key)
 
     
     @mock.patch("singer_encodings.compression.infer")
@@ -295,7 +347,7 @@ class TestUnsupportedFiles(unittest.TestCase):
         sample_rate = 5
         extension = "gz"
 
-        actual_output = [sample for sample in s3.sample_file(table_spec, s3_path, file_handle, sample_rate, extension)]
+        actual_output = [sample for sample in s3.sample_file(table_spec, "bucket", s3_path, file_handle, sample_rate, extension, {}, s3.FileStats())]
 
         self.assertTrue(len(actual_output)==0)
 
@@ -309,7 +361,7 @@ class TestUnsupportedFiles(unittest.TestCase):
         sample_rate = 5
         extension = "exe"
 
-        actual_output = [sample for sample in s3.sample_file(table_spec, s3_path, file_handle, sample_rate, extension)]
+        actual_output = [sample for sample in s3.sample_file(table_spec, "bucket", s3_path, file_handle, sample_rate, extension, {}, s3.FileStats())]
 
         self.assertTrue(len(actual_output)==0)
 
@@ -323,7 +375,7 @@ class TestUnsupportedFiles(unittest.TestCase):
         sample_rate = 5
         extension = s3_path.split(".")[-1].lower()
 
-        actual_output = [sample for sample in s3.sample_file(table_spec, s3_path, file_handle, sample_rate, extension)]
+        actual_output = [sample for sample in s3.sample_file(table_spec, "bucket", s3_path, file_handle, sample_rate, extension, {}, s3.FileStats())]
 
         self.assertTrue(len(actual_output)==0)
 
@@ -340,7 +392,7 @@ class TestUnsupportedFiles(unittest.TestCase):
 
         with gzip.GzipFile(gz_file_path) as gz_file:
 
-            actual_output = [sample for sample in s3.sample_file(table_spec, s3_path, gz_file.fileobj, sample_rate, extension)]
+            actual_output = [sample for sample in s3.sample_file(table_spec, "bucket", s3_path, gz_file.fileobj, sample_rate, extension, {}, s3.FileStats())]
 
             self.assertTrue(len(actual_output)==0)
 
@@ -357,7 +409,7 @@ class TestUnsupportedFiles(unittest.TestCase):
 
         with gzip.GzipFile(gz_file_path) as gz_file:
             
-            actual_output = [sample for sample in s3.sample_file(table_spec, s3_path, gz_file.fileobj, sample_rate, extension)]
+            actual_output = [sample for sample in s3.sample_file(table_spec, "bucket", s3_path, gz_file.fileobj, sample_rate, extension, {}, s3.FileStats())]
 
             self.assertTrue(len(actual_output)==0)
 
@@ -373,7 +425,7 @@ class TestUnsupportedFiles(unittest.TestCase):
 
         with gzip.GzipFile(gz_file_path) as gz_file:
             
-            actual_output = [sample for sample in s3.sample_file(table_spec, s3_path, gz_file.fileobj, sample_rate, extension)]
+            actual_output = [sample for sample in s3.sample_file(table_spec, "bucket", s3_path, gz_file.fileobj, sample_rate, extension, {}, s3.FileStats())]
 
             self.assertTrue(len(actual_output)==0)
 
@@ -388,10 +440,10 @@ class TestUnsupportedFiles(unittest.TestCase):
         table_spec = {}
         s3_files = "unittest_compressed_files/gz_stored_as_csv.csv"
         sample_rate = 5
-        config = []
+        config = {"bucket" : "bucket_name"}
 
 
-        actual_output = [sample for sample in s3.sample_files(config, table_spec, s3_files, sample_rate)]
+        actual_output = [sample for sample in s3.sample_files(config, table_spec, s3_files, s3.FileStats(), sample_rate)]
 
         self.assertTrue(len(actual_output)==0)
 
@@ -406,10 +458,10 @@ class TestUnsupportedFiles(unittest.TestCase):
         table_spec = {}
         s3_files = "unittest_compressed_files/gz_stored_as_jsonl.jsonl"
         sample_rate = 5
-        config = []
+        config = {"bucket" : "bucket_name"}
 
 
-        actual_output = [sample for sample in s3.sample_files(config, table_spec, s3_files, sample_rate)]
+        actual_output = [sample for sample in s3.sample_files(config, table_spec, s3_files, s3.FileStats(), sample_rate)]
 
         self.assertTrue(len(actual_output)==0)
 
@@ -427,7 +479,7 @@ class TestUnsupportedFiles(unittest.TestCase):
 
         with gzip.GzipFile(gz_file_path) as gz_file:
             
-            actual_output = [sample for sample in s3.sample_file(table_spec, s3_path, gz_file.fileobj, sample_rate, extension)]
+            actual_output = [sample for sample in s3.sample_file(table_spec, "bucket", s3_path, gz_file.fileobj, sample_rate, extension, {}, s3.FileStats())]
 
             self.assertTrue(len(actual_output)==0)
 
@@ -450,7 +502,7 @@ class TestUnsupportedFiles(unittest.TestCase):
             mocked_gz_file_name.return_value = None
 
             try:
-                s3.sample_file(table_spec, s3_path, gz_file.fileobj, sample_rate, extension)
+                s3.sample_file(table_spec, "bucket", s3_path, gz_file.fileobj, sample_rate, extension, {}, s3.FileStats())
             except Exception as e:
                 expected_message = '"{}" file has some error(s)'.format(s3_path)
                 self.assertEqual(expected_message, str(e))
@@ -463,7 +515,7 @@ class TestUnsupportedFiles(unittest.TestCase):
         stream = {}
         s3_path = "csv_files.exe"
         extension = "exe"
-        records = sync.sync_table_file(config, s3_path, table_spec, stream)
+        records = sync.sync_table_file(config, s3_path, table_spec, stream, s3.FileStats())
 
         mocked_logger.assert_called_with('"%s" having the ".%s" extension will not be synced.',s3_path,extension)
         self.assertEqual(0, records)
@@ -474,7 +526,7 @@ class TestUnsupportedFiles(unittest.TestCase):
         table_spec = {}
         stream = {}
         s3_path = "unittest_compressed_files/sample"
-        records = sync.sync_table_file(config, s3_path, table_spec, stream)
+        records = sync.sync_table_file(config, s3_path, table_spec, stream, s3.FileStats())
 
         self.assertEqual(0, records)
 
@@ -488,7 +540,7 @@ class TestUnsupportedFiles(unittest.TestCase):
 
         extension = s3_path.split(".")[-1].lower()
 
-        records = sync.handle_file(config, s3_path, table_spec, {}, extension)
+        records = sync.handle_file(config, s3_path, table_spec, {}, extension, s3.FileStats())
 
         self.assertEqual(0, records)
 
@@ -502,7 +554,7 @@ class TestUnsupportedFiles(unittest.TestCase):
 
         extension = s3_path.split(".")[-1].lower()
 
-        records = sync.handle_file(config, s3_path, table_spec, {}, extension)
+        records = sync.handle_file(config, s3_path, table_spec, {}, extension, s3.FileStats())
 
         self.assertEqual(0, records)
 
@@ -515,7 +567,7 @@ class TestUnsupportedFiles(unittest.TestCase):
         stream = {}
         s3_path = "unittest_compressed_files/gz_stored_as_csv.csv"
         extension = "csv"
-        records = sync.sync_table_file(config, s3_path, table_spec, stream)
+        records = sync.sync_table_file(config, s3_path, table_spec, stream, s3.FileStats())
 
         mocked_logger.assert_called_with('Skipping %s file as parsing failed. Verify an extension of the file.',s3_path)
         self.assertEqual(0, records)
@@ -527,7 +579,7 @@ class TestUnsupportedFiles(unittest.TestCase):
         stream = {}
         s3_path = "unittest_compressed_files/gz_stored_as_jsonl.jsonl"
         extension = "jsonl"
-        records = sync.sync_table_file(config, s3_path, table_spec, stream)
+        records = sync.sync_table_file(config, s3_path, table_spec, stream, s3.FileStats())
 
         mocked_logger.assert_called_with('Skipping %s file as parsing failed. Verify an extension of the file.',s3_path)
         self.assertEqual(0, records)
@@ -538,7 +590,7 @@ class TestUnsupportedFiles(unittest.TestCase):
         s3_path = "unittest_compressed_files/sample_compressed.tar.gz"
         extension = "gz"
 
-        records = sync.handle_file(config, s3_path, table_spec, {}, extension)
+        records = sync.handle_file(config, s3_path, table_spec, {}, extension, s3.FileStats())
 
         self.assertTrue(records == 0)
 
@@ -554,7 +606,7 @@ class TestUnsupportedFiles(unittest.TestCase):
 
         with gzip.GzipFile(gz_file_path) as gz_file:
 
-            records = sync.handle_file(config, s3_path, table_spec, {}, extension, gz_file.fileobj)
+            records = sync.handle_file(config, s3_path, table_spec, {}, extension, s3.FileStats(), gz_file.fileobj)
 
             self.assertEqual(records, 0)
 
@@ -572,7 +624,7 @@ class TestUnsupportedFiles(unittest.TestCase):
 
         with gzip.GzipFile(gz_file_path) as gz_file:
 
-            records = sync.handle_file(config, s3_path, table_spec, {}, extension, gz_file.fileobj)
+            records = sync.handle_file(config, s3_path, table_spec, {}, extension, s3.FileStats(), gz_file.fileobj)
 
             mocked_logger.assert_called_with('Skipping "%s" file as it contains nested compression.',s3_path)
             
@@ -589,7 +641,7 @@ class TestUnsupportedFiles(unittest.TestCase):
 
         with gzip.GzipFile(gz_file_path) as gz_file:
 
-            records = sync.handle_file(config, s3_path, table_spec, {}, extension, gz_file.fileobj)
+            records = sync.handle_file(config, s3_path, table_spec, {}, extension, s3.FileStats(), gz_file.fileobj)
 
             new_s3_path = "unittest_compressed_files/sample_compressed_gz_file_contains_zip.gz/csv_jsonl.zip"
 
@@ -613,42 +665,28 @@ class TestUnsupportedFiles(unittest.TestCase):
             mocked_gz_file_name.return_value = None
 
             try:
-                sync.handle_file(config, s3_path, table_spec, {}, extension, gz_file.fileobj)
+                sync.handle_file(config, s3_path, table_spec, {}, extension, s3.FileStats(), gz_file.fileobj)
             except Exception as e:
                 expected_message = '"{}" file has some error(s)'.format(s3_path)
                 self.assertEqual(expected_message, str(e))
 
 
-    @mock.patch("tap_s3_csv.s3.get_file_handle")
-    def test_get_sampling_files_with_file_without_extension(self, mocked_get_file_handle, mocked_logger):
-        config = {}
+    def test_get_sampling_files_with_file_without_extension(self, mocked_logger):
+        sample_key = "unittest_compressed_files/sample"
 
-        sample_key = { "key" : "unittest_compressed_files/sample" }
+        self.assertFalse(s3.has_supported_extension(sample_key, s3.SAMPLING_EXTENSIONS, s3.FileStats()))
 
-        mocked_get_file_handle.return_value = None
+        mocked_logger.assert_called_with('"%s" without extension will not be sampled.',sample_key)
 
-        files = s3.get_files_to_sample(config, [sample_key], 5)
 
-        self.assertTrue(len(files) == 0)
+    def test_get_sampling_files_with_unsupported_file(self, mocked_logger):
+        sample_key = "unittest_compressed_files/sample.exe"
 
-        mocked_logger.assert_called_with('"%s" without extension will not be sampled.',sample_key["key"])
-
-
-    @mock.patch("tap_s3_csv.s3.get_file_handle")
-    def test_get_sampling_files_with_unsupported_file(self, mocked_get_file_handle, mocked_logger):
-        config = {}
-
-        sample_key = { "key" : "unittest_compressed_files/sample.exe" }
-
-        extension = sample_key["key"].split(".")[-1].lower()
-
-        mocked_get_file_handle.return_value = None
-
-        files = s3.get_files_to_sample(config, [sample_key], 5)
+        extension = sample_key.split(".")[-1].lower()
 
-        self.assertTrue(len(files) == 0)
+        self.assertFalse(s3.has_supported_extension(sample_key, s3.SAMPLING_EXTENSIONS, s3.FileStats()))
 
-        mocked_logger.assert_called_with('"%s" having the ".%s" extension will not be sampled.',sample_key["key"],extension)
+        mocked_logger.assert_called_with('"%s" having the ".%s" extension will not be sampled.',sample_key,extension)
 
 
 @mock.patch("singer.Transformer",side_effect=mockclass)
@@ -671,7 +709,7 @@ class TestSyncingCompressedFiles(unittest.TestCase):
 
         with gzip.GzipFile(gz_file_path) as gz_file:
 
-            records = sync.handle_file(config, s3_path, table_spec, stream, extension, gz_file.fileobj)
+            records = sync.handle_file(config, s3_path, table_spec, stream, extension, s3.FileStats(), gz_file.fileobj)
 
             self.assertTrue(records == 998)
 
@@ -691,7 +729,7 @@ class TestSyncingCompressedFiles(unittest.TestCase):
 
         with gzip.GzipFile(gz_file_path) as gz_file:
 
-            records = sync.handle_file(config, s3_path, table_spec, stream, extension, gz_file.fileobj)
+            records = sync.handle_file(config, s3_path, table_spec, stream, extension, s3.FileStats(), gz_file.fileobj)
 
             self.assertTrue(records == 2)
 
@@ -711,7 +749,7 @@ class TestSyncingCompressedFiles(unittest.TestCase):
 
         with open(csv_file_path, "rb") as csv_file:
 
-            records = sync.handle_file(config, s3_path, table_spec, stream, extension, csv_file)
+            records = sync.handle_file(config, s3_path, table_spec, stream, extension, s3.FileStats(), csv_file)
 
             self.assertTrue(records == 998)
     
@@ -731,7 +769,7 @@ class TestSyncingCompressedFiles(unittest.TestCase):
 
         with open(jsonl_file_path, "rb") as jsonl_file:
 
-            records = sync.handle_file(config, s3_path, table_spec, stream, extension, jsonl_file)
+            records = sync.handle_file(config, s3_path, table_spec, stream, extension, s3.FileStats(), jsonl_file)
 
             self.assertTrue(records == 10)
 
@@ -754,7 +792,7 @@ class TestSyncingCompressedFiles(unittest.TestCase):
 
             mocked_file_handle.return_value = zip_file.fp
             mocked_infer.return_value = [zip_file.open(file) for file in zip_file.namelist()]
-            records = sync.sync_compressed_file(config, s3_path, table_spec, stream)
+            records = sync.sync_compressed_file(config, s3_path, table_spec, stream, s3.FileStats())
 
             self.assertTrue(records == 1983)
 
@@ -777,6 +815,6 @@ class TestSyncingCompressedFiles(unittest.TestCase):
 
             mocked_file_handle.return_value = zip_file.fp
             mocked_infer.return_value = [zip_file.open(file) for file in zip_file.namelist()]
-            records = sync.sync_compressed_file(config, s3_path, table_spec, stream)
+            records = sync.sync_compressed_file(config, s3_path, table_spec, stream, s3.FileStats())
 
             self.assertTrue(records == 4)
@@ -1,4 +1,5 @@
 import unittest
+import pyarrow as pa
 from tap_s3_csv import conversion
 from unittest import mock
 
@@ -104,3 +105,29 @@ class TestConversion(unittest.TestCase):
         res = conversion.generate_schema(samples, table_spec)
         expected_result = {'name': {'type': ['null', 'string']}, 'id': {'type': ['null', 'integer', 'string']}, 'marks': {'anyOf': [{'type': 'array', 'items': {'type': ['null', 'number', 'string']}}, {'type': ['null', 'string']}]}, 'students': {'anyOf': [{'type': 'object', 'properties': {}}, {'type': ['null', 'string']}]}, 'created_at': {'anyOf': [{'type': ['null', 'string'], 'format': 'date-time'}, {'type': ['null', 'string']}]}, 'tota': {'anyOf': [{'type': 'array', 'items': ['null', 'string']}, {'type': ['null', 'string']}]}}
         self.assertEqual(res, expected_result)
+
+    def test_generate_schema_from_generator(self):
+        samples = ({'id': i, 'name': 'name_{}'.format(i)} for i in range(3))
+        res = conversion.generate_schema(samples, {})
+        expected_result = {'id': {'type': ['null', 'integer', 'string']}, 'name': {'type': ['null', 'string']}}
+        self.assertEqual(res, expected_result)
+
+    ## Tests of Arrow schemas
+
+    def test_infer_arrow(self):
+        self.assertEqual(conversion.infer_arrow('id', pa.int32(), []), 'integer')
+        self.assertEqual(conversion.infer_arrow('price', pa.decimal128(10, 2), []), 'number')
+        self.assertEqual(conversion.infer_arrow('name', pa.dictionary(pa.int8(), pa.string()), []), 'string')
+        self.assertEqual(conversion.infer_arrow('created_at', pa.timestamp('us'), []), 'string')
+        self.assertEqual(conversion.infer_arrow('created_at', pa.string(), ['created_at']), 'date-time')
+        self.assertEqual(conversion.infer_arrow('students', pa.struct([('no', pa.int64())]), []), 'dict')
+        self.assertEqual(conversion.infer_arrow('marks', pa.list_(pa.float64()), []), 'list.number')
+        self.assertEqual(conversion.infer_arrow('matrix', pa.list_(pa.list_(pa.int64())), []), 'list.string')
+        self.assertIsNone(conversion.infer_arrow('empty', pa.null(), []))
+
+    def test_generate_schema_merges_arrow_schema_with_records(self):
+        samples = [{'id': 2.5, 'name': 'test'}]
+        arrow_schemas = [pa.schema([('id', pa.int64()), ('marks', pa.list_(pa.float64()))])]
+        res = conversion.generate_schema(samples, {}, arrow_schemas)
+        expected_result = {'id': {'type': ['null', 'number', 'string']}, 'name': {'type': ['null', 'string']}, 'marks': {'anyOf': [{'type': 'array', 'items': {'type': ['null', 'number', 'string']}}, {'type': ['null', 'string']}]}}
+        self.assertEqual(res, expected_result)
@@ -0,0 +1,89 @@
+import io
+import itertools
+import unittest
+from unittest import mock
+from singer_encodings import csv
+from tap_s3_csv import s3
+
+
+def generate_csv(num_rows):
+    lines = [b"id,name,score"] + ["{},name_{},{}.5".format(i, i, i).encode() for i in range(num_rows)]
+    return b"\n".join(lines) + b"\n"
+
+
+class TestCsvSampling(unittest.TestCase):
+    '''
+    Unit tests of funtions:
+
+    s3.py
+    sample_file - Check CSV streams are sampled with pyarrow and fall back to singer_encodings
+    '''
+
+    def test_arrow_samples_match_singer_encodings_samples(self):
+        data = generate_csv(50)
+
+        arrow_records = list(s3.sample_file({}, "bucket", "test/abc.csv", io.BytesIO(data), 5, "csv", {}, s3.FileStats()))
+        expected_records = list(s3.sample_file({}, "bucket", "test/abc.csv", data.splitlines(keepends=True), 5, "csv", {}, s3.FileStats()))
+
+        self.assertEqual(10, len(arrow_records))
+        self.assertEqual({"id": "5", "name": "name_5", "score": "5.5"}, arrow_records[1])
+        self.assertListEqual(expected_records, arrow_records)
+
+    @mock.patch("tap_s3_csv.s3.ARROW_CSV_BLOCK_SIZE", 100)
+    def test_sampling_continues_past_leading_block(self):
+        data = generate_csv(50)
+
+        records = list(s3.sample_file({}, "bucket", "test/abc.csv", io.BytesIO(data), 3, "csv", {}, s3.FileStats()))
+
+        self.assertListEqual([str(i) for i in range(0, 50, 3)], [record["id"] for record in records])
+
+    @mock.patch("tap_s3_csv.s3.CSV_HEAD_CHUNK_SIZE", 64)
+    def test_head_holds_only_the_lines_of_max_records(self):
+        file_handle = io.BytesIO(generate_csv(1000))
+
+        records = s3.sample_file({}, "bucket", "test/abc.csv", file_handle, 5, "csv", {}, s3.FileStats(), max_records=10)
+
+        self.assertListEqual([str(i) for i in range(0, 50, 5)], [record["id"] for record in itertools.islice(records, 10)])
+        self.assertLess(file_handle.tell(), len(generate_csv(60)))
+
+    def test_head_cut_inside_multiline_value_matches_singer_encodings(self):
+        data = b"id,notes\n" + b"".join(b'%d,"line one %d\nline two"\n' % (i, i) for i in range(30))
+        iterator = csv.get_row_iterator(io.BytesIO(data), {}, None, True)
+        expected_records = list(itertools.islice(s3.get_records_for_csv("test/abc.csv", 1, iterator), 3))
+
+        # Chunk sizes ending the head on both sides of the quoted line breaks
+        for chunk_size in range(8, 40):
+            with mock.patch("tap_s3_csv.s3.CSV_HEAD_CHUNK_SIZE", chunk_size):
+                records = s3.sample_file({}, "bucket", "test/abc.csv", io.BytesIO(data), 1, "csv", {}, s3.FileStats(), max_records=3)
+                records = list(itertools.islice(records, 3))
+
+            self.assertListEqual(expected_records, records)
+
+    def test_nul_bytes_are_dropped(self):
+        data = b"id,name\n1,a\x00b\n"
+
+        records = list(s3.sample_file({}, "bucket", "test/abc.csv", io.BytesIO(data), 1, "csv", {}, s3.FileStats()))
+
+        self.assertListEqual([{"id": "1", "name": "ab"}], records)
+
+    def test_ragged_rows_fall_back_to_singer_encodings(self):
+        data = b"a,b\n1,2\n3,4,5\n6\n"
+
+        records = list(s3.sample_file({}, "bucket", "test/abc.csv", io.BytesIO(data), 1, "csv", {}, s3.FileStats()))
+
+        self.assertListEqual([{"a": "1", "b": "2"}, {"a": "3", "b": "4"}, {"a": "6"}], records)
+
+    def test_duplicate_headers_fall_back_to_singer_encodings(self):
+        data = b"a,a,b\n1,2,3\n"
+
+        records = list(s3.sample_file({}, "bucket", "test/abc.csv", io.BytesIO(data), 1, "csv", {}, s3.FileStats()))
+
+        self.assertListEqual([{"a": "1", "b": "3"}], records)
+
+    def test_missing_key_properties_in_header(self):
+        table_spec = {'key_properties': ['id']}
+
+        with self.assertRaises(Exception) as e:
+            s3.sample_file(table_spec, "bucket", "test/abc.csv", io.BytesIO(b"a,b\n1,2\n"), 1, "csv", {}, s3.FileStats())
+
+        self.assertEqual(str(e.exception), "CSV file missing required headers: {'id'}")
@@ -0,0 +1,99 @@
+import unittest
+from datetime import datetime
+from unittest import mock
+import pytz
+from tap_s3_csv import s3
+
+
+def mock_list_files_in_bucket(bucket, search_prefix=None, config=None):
+    return [
+        {'Key': 'exports/a.csv', 'LastModified': datetime(2021, 1, 1, tzinfo=pytz.UTC), 'Size': 10},
+        {'Key': 'exports/b.csv', 'LastModified': datetime(2021, 6, 1, tzinfo=pytz.UTC), 'Size': 10},
+        {'Key': 'exports/c.csv', 'LastModified': datetime(2022, 1, 1, tzinfo=pytz.UTC), 'Size': 10},
+        {'Key': 'exports/d.csv', 'LastModified': datetime(2021, 6, 1, tzinfo=pytz.UTC), 'Size': 0},
+        {'Key': 'other/e.csv', 'LastModified': datetime(2021, 6, 1, tzinfo=pytz.UTC), 'Size': 10},
+    ]
+
+
+@mock.patch("tap_s3_csv.s3.list_files_in_bucket", side_effect=mock_list_files_in_bucket)
+class TestGetInputFilesForTable(unittest.TestCase):
+
+    config = {'bucket': 'test_bucket'}
+    table_spec = {'table_name': 'test_table', 'search_pattern': 'exports/.*\\.csv'}
+
+    def test_files_within_modified_window(self, mocked_list_files_in_bucket):
+        files = s3.get_input_files_for_table(self.config, self.table_spec, s3.FileStats(),
+                                             modified_since=datetime(2020, 12, 1, tzinfo=pytz.UTC),
+                                             modified_until='2021-12-01T00:00:00Z')
+
+        self.assertListEqual(['exports/a.csv', 'exports/b.csv'], [file['key'] for file in files])
+
+    def test_files_without_modified_until(self, mocked_list_files_in_bucket):
+        files = s3.get_input_files_for_table(self.config, self.table_spec, s3.FileStats(),
+                                             modified_since=datetime(2021, 3, 1, tzinfo=pytz.UTC))
+
+        self.assertListEqual(['exports/b.csv', 'exports/c.csv'], [file['key'] for file in files])
+
+    def test_no_files_matching_pattern(self, mocked_list_files_in_bucket):
+        table_spec = {'table_name': 'test_table', 'search_pattern': 'missing/.*\\.csv'}
+
+        with self.assertRaises(Exception) as e:
+            list(s3.get_input_files_for_table(self.config, table_spec, s3.FileStats()))
+
+        self.assertEqual(str(e.exception), 'No files found matching pattern missing/.*\\.csv')
+
+
+class TestGetKeyMatcher(unittest.TestCase):
+
+    def test_literal_prefix_pattern_uses_startswith(self):
+        search = s3.get_key_matcher('^exports/a\\.csv')
+
+        self.assertTrue(search('exports/a.csv'))
+        self.assertFalse(search('other/exports/a.csv'))
+        self.assertFalse(search('exports/abcsv'))
+
+    def test_literal_prefix_pattern_with_trailing_wildcard(self):
+        search = s3.get_key_matcher('^exports/.*')
+
+        self.assertTrue(search('exports/a.csv'))
+        self.assertFalse(search('other/e.csv'))
+
+    def test_regex_pattern_is_searched_anywhere_in_key(self):
+        search = s3.get_key_matcher('a\\.csv$')
+
+        self.assertTrue(search('exports/a.csv'))
+        self.assertFalse(search('exports/a.csv.gz'))
+
+    def test_invalid_pattern_raises_re_error(self):
+        with self.assertRaises(s3.re.error):
+            s3.get_key_matcher('exports/(.csv')
+
+
+class TestPrefetchPages(unittest.TestCase):
+
+    def test_pages_are_yielded_in_order(self):
+        pages = [{'Contents': [i]} for i in range(10)]
+
+        self.assertListEqual(pages, list(s3.prefetch_pages(iter(pages), 2)))
+
+    def test_error_while_fetching_is_raised_to_consumer(self):
+        def pages():
+            yield {'Contents': [1]}
+            raise ValueError("listing failed")
+
+        prefetched = s3.prefetch_pages(pages())
+
+        self.assertEqual({'Contents': [1]}, next(prefetched))
+        with self.assertRaises(ValueError):
+            next(prefetched)
+
+    @mock.patch("tap_s3_csv.s3.get_s3_client")
+    def test_list_files_in_bucket_yields_objects_of_all_pages(self, mocked_get_s3_client):
+        paginator = mocked_get_s3_client.return_value.get_paginator.return_value
+        paginator.paginate.return_value = iter([{'Contents': [{'Key': 'a'}, {'Key': 'b'}]}, {'Contents': [{'Key': 'c'}]}])
+
+        objects = list(s3.list_files_in_bucket('test_bucket', 'exports', config={}))
+
+        self.assertListEqual(['a', 'b', 'c'], [s3_object['Key'] for s3_object in objects])
+        paginator.paginate.assert_called_with(Bucket='test_bucket', MaxKeys=1000, Prefix='exports')
+
@@ -1,3 +1,4 @@
+import itertools
 import unittest
 from unittest import mock
 from tap_s3_csv import s3
@@ -36,7 +37,7 @@ def mock_json_file_handler_5_records_for_s3(config, s3_path):
 def mock_sync_jsonl_file(config, iterator, s3_path, table_spec, stream):
     return 1
 
-def mock_sync_csv_file(config, file_handle, s3_path, table_spec, stream):
+def mock_sync_csv_file(config, file_handle, s3_path, table_spec, stream, stats=None):
     return 1
 
 class TestJsonlSupport(unittest.TestCase):
@@ -72,7 +73,7 @@ class TestJsonlSupport(unittest.TestCase):
             {"name":"test2","id":"3"},
             {"name":"test4","id":"5","marks":"['221','222']"}
         ]
-        result = s3.sample_file(table_spec, s3_path, file_handle, sample_rate, "jsonl")
+        result = s3.sample_file(table_spec, "bucket", s3_path, file_handle, sample_rate, "jsonl", {}, s3.FileStats())
         self.assertListEqual(list(result),expected_result)
 
 
@@ -101,7 +102,7 @@ class TestJsonlSupport(unittest.TestCase):
             {"name":"test6","id":"7"},
             {"name":"test9","id":"10","marks":"['111','112']"}
         ]
-        result = s3.sample_file(table_spec, s3_path, file_handle, sample_rate, "jsonl")
+        result = s3.sample_file(table_spec, "bucket", s3_path, file_handle, sample_rate, "jsonl", {}, s3.FileStats())
         self.assertListEqual(list(result),expected_result)
 
 
@@ -185,7 +186,7 @@ class TestJsonlSupport(unittest.TestCase):
         ]
         sample_rate = 5
 
-        s3.sample_file(table_spec, s3_path, file_handle, sample_rate, "jsonl")
+        s3.sample_file(table_spec, "bucket", s3_path, file_handle, sample_rate, "jsonl", {}, s3.FileStats())
         self.assertEqual(mock_get_records_for_jsonl.call_count, 1)
 
 
@@ -199,7 +200,7 @@ class TestJsonlSupport(unittest.TestCase):
         ]
         sample_rate = 5
 
-        records = s3.sample_file(table_spec, s3_path, file_handle, sample_rate, "csv")
+        records = s3.sample_file(table_spec, "bucket", s3_path, file_handle, sample_rate, "csv", {}, s3.FileStats())
         self.assertEqual(len(list(records)), 1)
 
     def test_get_record_for_csv_called_in_sample_file_for_txt_file(self):
@@ -212,7 +213,7 @@ class TestJsonlSupport(unittest.TestCase):
         ]
         sample_rate = 5
 
-        records = s3.sample_file(table_spec, s3_path, file_handle, sample_rate, "txt")
+        records = s3.sample_file(table_spec, "bucket", s3_path, file_handle, sample_rate, "txt", {}, s3.FileStats())
         self.assertEqual(len(list(records)), 1)
 
     @mock.patch("tap_s3_csv.s3.get_file_handle", side_effect=mock_json_file_handler_5_records_for_s3)
@@ -225,7 +226,7 @@ class TestJsonlSupport(unittest.TestCase):
         stream = {'stream': 'jsonl_table', 'tap_stream_id': 'jsonl_table', 'schema': {'type': 'object', 'properties': {'name': {'type': ['string', 'null']}, 'id': {'type': ['integer', 'string', 'null']}, 'marks': {'type': 'array', 'items': {'type': ['integer', 'string', 'null']}}, 'students': {'type': 'object', 'properties': {}}, '_sdc_source_bucket': {'type': 'string'}, '_sdc_source_file': {'type': 'string'}, '_sdc_source_lineno': {'type': 'integer'}, '_sdc_extra': {'type': 'array', 'items': {'type': 'string'}}}}, 'metadata': [{'breadcrumb': [], 'metadata': {'selected': True, 'table-key-properties': ['id']}}, {'breadcrumb': ['properties', 'name'], 'metadata': {
             'inclusion': 'available'}}, {'breadcrumb': ['properties', 'id'], 'metadata': {'inclusion': 'automatic'}}, {'breadcrumb': ['properties', 'marks'], 'metadata': {'inclusion': 'available'}}, {'breadcrumb': ['properties', 'students'], 'metadata': {'inclusion': 'available'}}, {'breadcrumb': ['properties', '_sdc_source_bucket'], 'metadata': {'inclusion': 'available'}}, {'breadcrumb': ['properties', '_sdc_source_file'], 'metadata': {'inclusion': 'available'}}, {'breadcrumb': ['properties', '_sdc_source_lineno'], 'metadata': {'inclusion': 'available'}}, {'breadcrumb': ['properties', '_sdc_extra'], 'metadata': {'inclusion': 'available'}}]}
 
-        sync.sync_table_file(config, s3_path, table_spec, stream)
+        sync.sync_table_file(config, s3_path, table_spec, stream, s3.FileStats())
         self.assertEqual(mock_sync_jsonl_file.call_count, 1)
 
     @mock.patch("tap_s3_csv.s3.get_file_handle", side_effect=mock_json_file_handler_5_records_for_s3)
@@ -238,7 +239,7 @@ class TestJsonlSupport(unittest.TestCase):
         stream = {'stream': 'jsonl_table', 'tap_stream_id': 'jsonl_table', 'schema': {'type': 'object', 'properties': {'name': {'type': ['string', 'null']}, 'id': {'type': ['integer', 'string', 'null']}, 'marks': {'type': 'array', 'items': {'type': ['integer', 'string', 'null']}}, 'students': {'type': 'object', 'properties': {}}, '_sdc_source_bucket': {'type': 'string'}, '_sdc_source_file': {'type': 'string'}, '_sdc_source_lineno': {'type': 'integer'}, '_sdc_extra': {'type': 'array', 'items': {'type': 'string'}}}}, 'metadata': [{'breadcrumb': [], 'metadata': {'selected': True, 'table-key-properties': ['id']}}, {'breadcrumb': ['properties', 'name'], 'metadata': {
             'inclusion': 'available'}}, {'breadcrumb': ['properties', 'id'], 'metadata': {'inclusion': 'automatic'}}, {'breadcrumb': ['properties', 'marks'], 'metadata': {'inclusion': 'available'}}, {'breadcrumb': ['properties', 'students'], 'metadata': {'inclusion': 'available'}}, {'breadcrumb': ['properties', '_sdc_source_bucket'], 'metadata': {'inclusion': 'available'}}, {'breadcrumb': ['properties', '_sdc_source_file'], 'metadata': {'inclusion': 'available'}}, {'breadcrumb': ['properties', '_sdc_source_lineno'], 'metadata': {'inclusion': 'available'}}, {'breadcrumb': ['properties', '_sdc_extra'], 'metadata': {'inclusion': 'available'}}]}
         
-        sync.sync_table_file(config, s3_path, table_spec, stream)
+        sync.sync_table_file(config, s3_path, table_spec, stream, s3.FileStats())
         self.assertEqual(mock_sync_csv_file.call_count, 1)
 
     @mock.patch("tap_s3_csv.s3.get_file_handle", side_effect=mock_json_file_handler_5_records_for_s3)
@@ -251,7 +252,7 @@ class TestJsonlSupport(unittest.TestCase):
         stream = {'stream': 'jsonl_table', 'tap_stream_id': 'jsonl_table', 'schema': {'type': 'object', 'properties': {'name': {'type': ['string', 'null']}, 'id': {'type': ['integer', 'string', 'null']}, 'marks': {'type': 'array', 'items': {'type': ['integer', 'string', 'null']}}, 'students': {'type': 'object', 'properties': {}}, '_sdc_source_bucket': {'type': 'string'}, '_sdc_source_file': {'type': 'string'}, '_sdc_source_lineno': {'type': 'integer'}, '_sdc_extra': {'type': 'array', 'items': {'type': 'string'}}}}, 'metadata': [{'breadcrumb': [], 'metadata': {'selected': True, 'table-key-properties': ['id']}}, {'breadcrumb': ['properties', 'name'], 'metadata': {
             'inclusion': 'available'}}, {'breadcrumb': ['properties', 'id'], 'metadata': {'inclusion': 'automatic'}}, {'breadcrumb': ['properties', 'marks'], 'metadata': {'inclusion': 'available'}}, {'breadcrumb': ['properties', 'students'], 'metadata': {'inclusion': 'available'}}, {'breadcrumb': ['properties', '_sdc_source_bucket'], 'metadata': {'inclusion': 'available'}}, {'breadcrumb': ['properties', '_sdc_source_file'], 'metadata': {'inclusion': 'available'}}, {'breadcrumb': ['properties', '_sdc_source_lineno'], 'metadata': {'inclusion': 'available'}}, {'breadcrumb': ['properties', '_sdc_extra'], 'metadata': {'inclusion': 'available'}}]}
         
-        sync.sync_table_file(config, s3_path, table_spec, stream)
+        sync.sync_table_file(config, s3_path, table_spec, stream, s3.FileStats())
         self.assertEqual(mock_sync_csv_file.call_count, 1)
 
     @mock.patch("tap_s3_csv.s3.LOGGER.info")
@@ -268,6 +269,34 @@ class TestJsonlSupport(unittest.TestCase):
             pass
         mocked_logger.assert_called_with("Sampled %s rows from %s", 0, s3_path)
 
+    def test_get_records_for_jsonl_skips_blank_lines_and_parses_nan(self):
+
+        s3_path = "test\\abc.jsonl"
+        sample_rate = 2
+        iterator = [
+            b'{"name":"test","id":1}\n',
+            b'{"name":"test1","id":2}\n',
+            b'\n',
+            b'{"name":"test3","id":4}\n',
+            b'{"name":"test4","id":5,"score":NaN}\n'
+        ]
+
+        records = list(s3.get_records_for_jsonl(s3_path, sample_rate, iterator))
+
+        self.assertEqual(2, len(records))
+        self.assertEqual({"name":"test","id":1}, records[0])
+        self.assertEqual(5, records[1]["id"])
+
+    def test_sample_file_for_jsonl_checks_key_properties_past_max_records(self):
+
+        s3_path = "test\\abc.jsonl"
+        table_spec = {'table_name': 'test_table', 'key_properties': ['id']}
+        file_handle = [b'{"name":"test"}\n'] * 2000 + [b'{"name":"test","id":1}\n']
+
+        records = s3.sample_file(table_spec, "bucket", s3_path, file_handle, 1, "jsonl", {}, s3.FileStats(), max_records=1000)
+
+        self.assertEqual(1000, len(list(itertools.islice(records, 1000))))
+
     def test_sync_jsonl_file_with_empty_json(self):
     
         s3_path = "test\\abc.jsonl"
@@ -1,5 +1,6 @@
 import unittest
 from unittest import mock
+from tap_s3_csv import s3
 from tap_s3_csv import sync
 
 def mockTransformer():
@@ -24,7 +25,7 @@ class TestKeyErrorFOrCatalogPropeties(unittest.TestCase):
         ]
         s3_path = "unittest/sample.csv"
 
-        sync.sync_csv_file(config, file_handle, s3_path, table_spec, stream)
+        sync.sync_csv_file(config, file_handle, s3_path, table_spec, stream, s3.FileStats())
         mocked_get_row_iterator.assert_called_with(file_handle, table_spec, stream["schema"]["properties"].keys(), True)
 
     def test_catalog_with_no_properties(self, mockTransformer, mocked_get_row_iterator):
@@ -37,5 +38,5 @@ class TestKeyErrorFOrCatalogPropeties(unittest.TestCase):
         ]
         s3_path = "unittest/sample.csv"
         
-        sync.sync_csv_file(config, file_handle, s3_path, table_spec, stream)
+        sync.sync_csv_file(config, file_handle, s3_path, table_spec, stream, s3.FileStats())
         mocked_get_row_iterator.assert_called_with(file_handle, table_spec, None, True)
@@ -0,0 +1,244 @@
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+import pyarrow as pa
+import pyarrow.parquet as pq
+from tap_s3_csv import s3
+from tap_s3_csv import sync
+from tap_s3_csv import utils
+
+
+def generate_parquet_file(num_rows, row_group_size):
+    table = pa.table({
+        "id": list(range(num_rows)),
+        "name": ["name_{}".format(i) for i in range(num_rows)]
+    })
+    buffer = io.BytesIO()
+    pq.write_table(table, buffer, row_group_size=row_group_size)
+    return buffer.getvalue()
+
+
+class MockS3Object():
+    """Serves the size and byte ranges of an in-memory object and records the fetched ranges."""
+
+    def __init__(self, data):
+        self.data = data
+        self.fetched_bytes = 0
+
+    def get_object_size(self, config, s3_bucket, s3_path):
+        return len(self.data)
+
+    def get_object_range(self, config, s3_bucket, s3_path, start, end):
+        self.fetched_bytes += end - start + 1
+        return self.data[start:end + 1]
+
+    def patch(self):
+        return mock.patch.multiple("tap_s3_csv.s3",
+                                   get_object_size=self.get_object_size,
+                                   get_object_range=self.get_object_range)
+
+
+class TestParquetSupport(unittest.TestCase):
+    '''
+    Unit tests of funtions:
+
+    s3.py
+    S3ObjectFile
+    get_parquet_schema
+    get_records_for_parquet
+    sample_file - Check key properties of parquet file
+    get_sampled_schema_for_table
+    '''
+
+    s3_path = "unittest_parquet_files/sample.parquet"
+
+    def test_s3_object_file_reads_ranges(self):
+        s3_object = MockS3Object(b"0123456789")
+
+        with s3_object.patch():
+            s3_file = s3.S3ObjectFile({}, "bucket", self.s3_path)
+            s3_file.seek(-4, io.SEEK_END)
+            self.assertEqual(b"67", s3_file.read(2))
+            self.assertEqual(8, s3_file.tell())
+            self.assertEqual(b"89", s3_file.read())
+            self.assertEqual(b"", s3_file.read(5))
+
+        self.assertEqual(4, s3_object.fetched_bytes)
+
+    def test_get_parquet_schema_reads_only_the_footer(self):
+        s3_object = MockS3Object(generate_parquet_file(100000, 10000))
+
+        with s3_object.patch():
+            schema = s3.get_parquet_schema("bucket", self.s3_path, {})
+
+        self.assertListEqual(["id", "name"], schema.names)
+        self.assertEqual(pa.int64(), schema.field("id").type)
+        self.assertLess(s3_object.fetched_bytes, len(s3_object.data) / 10)
+
+    def test_get_parquet_schema_of_empty_file(self):
+        s3_object = MockS3Object(generate_parquet_file(0, 4))
+
+        with s3_object.patch():
+            self.assertIsNone(s3.get_parquet_schema("bucket", self.s3_path, {}))
+
+    def test_get_records_for_parquet_with_sample_rate_across_row_groups(self):
+        s3_object = MockS3Object(generate_parquet_file(10, 4))
+
+        with s3_object.patch():
+            records = list(s3.get_records_for_parquet("bucket", self.s3_path, 3, {}))
+
+        self.assertListEqual([0, 3, 6, 9], [record["id"] for record in records])
+        self.assertEqual({"id": 3, "name": "name_3"}, records[1])
+
+    def test_get_records_for_parquet_stops_at_max_records(self):
+        s3_object = MockS3Object(generate_parquet_file(100000, 10000))
+
+        with s3_object.patch():
+            records = list(s3.get_records_for_parquet("bucket", self.s3_path, 2, {}, max_records=5))
+
+        self.assertListEqual([0, 2, 4, 6, 8], [record["id"] for record in records])
+        # Only the footer and the first row group are fetched
+        self.assertLess(s3_object.fetched_bytes, len(s3_object.data) / 2)
+
+    def test_sample_file_for_parquet_checks_key_properties(self):
+        s3_object = MockS3Object(generate_parquet_file(10, 4))
+        table_spec = {'key_properties': ['id']}
+
+        with s3_object.patch():
+            samples = list(s3.sample_file(table_spec, "bucket", self.s3_path, None, 5, "parquet", {}, s3.FileStats()))
+
+        self.assertListEqual([{"id": 0, "name": "name_0"}, {"id": 5, "name": "name_5"}], samples)
+
+    def test_sample_file_for_parquet_reads_only_string_columns(self):
+        s3_object = MockS3Object(generate_parquet_file(10, 4))
+        arrow_schemas = []
+
+        with s3_object.patch():
+            samples = list(s3.sample_file({}, "bucket", self.s3_path, None, 5, "parquet", {}, s3.FileStats(), arrow_schemas=arrow_schemas))
+
+        self.assertListEqual([{"name": "name_0"}, {"name": "name_5"}], samples)
+        self.assertListEqual([pa.schema([("id", pa.int64())])], arrow_schemas)
+
+    @mock.patch("tap_s3_csv.s3.get_input_files_for_table", return_value=[{"key": "unittest_parquet_files/sample.parquet"}])
+    def test_sampled_schema_infers_numbers_in_string_columns(self, mocked_get_input_files_for_table):
+        table = pa.table({"id": [1, 2], "code": ["10", "20"], "amount": [1.5, None]})
+        buffer = io.BytesIO()
+        pq.write_table(table, buffer)
+        s3_object = MockS3Object(buffer.getvalue())
+        config = {"bucket": "bucket", "start_date": "2021-01-01T00:00:00Z"}
+
+        with s3_object.patch():
+            schema = s3.get_sampled_schema_for_table(config, {})
+
+        # String columns are inferred from their values, like the records of other files
+        self.assertEqual({"type": ["null", "integer", "string"]}, schema["properties"]["code"])
+        self.assertEqual({"type": ["null", "integer", "string"]}, schema["properties"]["id"])
+        self.assertEqual({"type": ["null", "number", "string"]}, schema["properties"]["amount"])
+
+    def test_sample_file_for_parquet_missing_key_properties(self):
+        s3_object = MockS3Object(generate_parquet_file(10, 4))
+        table_spec = {'key_properties': ['idea']}
+
+        with s3_object.patch():
+            with self.assertRaises(Exception) as e:
+                s3.sample_file(table_spec, "bucket", self.s3_path, None, 5, "parquet", {}, s3.FileStats())
+
+        self.assertEqual(str(e.exception), 'JSONL/parquet file "{}" is missing required key_properties key: {}'.format(self.s3_path, {'idea'}))
+
+
+def mock_download_file(config, s3_bucket, s3_path, local_path):
+    with open(local_path, "wb") as local_file:
+        local_file.write(generate_parquet_file(10, 4))
+
+
+@mock.patch("tap_s3_csv.s3.download_file", side_effect=mock_download_file)
+@mock.patch("tap_s3_csv.s3.get_object_etag", return_value="etag-1")
+class TestParquetCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.config = {"local_cache_dir": self.cache_dir.name}
+
+    def tearDown(self):
+        self.cache_dir.cleanup()
+
+    def test_cached_file_is_downloaded_once_per_etag(self, mocked_get_object_etag, mocked_download_file):
+        first_path = s3.get_cached_file(self.config, "bucket", "a.parquet")
+        second_path = s3.get_cached_file(self.config, "bucket", "a.parquet")
+
+        self.assertEqual(first_path, second_path)
+        self.assertEqual(1, mocked_download_file.call_count)
+        self.assertEqual(10, pq.ParquetFile(first_path, memory_map=True).metadata.num_rows)
+
+        mocked_get_object_etag.return_value = "etag-2"
+        third_path = s3.get_cached_file(self.config, "bucket", "a.parquet")
+
+        self.assertNotEqual(first_path, third_path)
+        self.assertEqual(2, mocked_download_file.call_count)
+
+    def test_object_changed_during_download_is_cached_under_new_etag(self, mocked_get_object_etag, mocked_download_file):
+        mocked_get_object_etag.side_effect = ["etag-1", "etag-2", "etag-2"]
+
+        local_path = s3.get_cached_file(self.config, "bucket", "a.parquet")
+
+        self.assertEqual(2, mocked_download_file.call_count)
+        self.assertListEqual([os.path.basename(local_path)], os.listdir(self.cache_dir.name))
+
+        mocked_get_object_etag.side_effect = None
+        mocked_get_object_etag.return_value = "etag-1"
+        s3.get_cached_file(self.config, "bucket", "a.parquet")
+
+        # Nothing was cached for the ETag seen before the object changed
+        self.assertEqual(3, mocked_download_file.call_count)
+
+    def test_object_changing_on_every_download(self, mocked_get_object_etag, mocked_download_file):
+        mocked_get_object_etag.side_effect = ["etag-{}".format(i) for i in range(10)]
+
+        with self.assertRaises(Exception) as e:
+            s3.get_cached_file(self.config, "bucket", "a.parquet")
+
+        self.assertEqual('"a.parquet" kept changing while it was downloaded', str(e.exception))
+        self.assertListEqual([], os.listdir(self.cache_dir.name))
+
+    def test_least_recently_used_files_are_evicted(self, mocked_get_object_etag, mocked_download_file):
+        paths = []
+        for i in range(3):
+            mocked_get_object_etag.return_value = "etag-{}".format(i)
+            paths.append(s3.get_cached_file(self.config, "bucket", "a.parquet"))
+            # Spread the access times so the eviction order does not depend on the clock resolution
+            os.utime(paths[-1], (i, i))
+
+        os.utime(paths[0], (10, 10))
+        utils.evict_lru_files(self.cache_dir.name, 2 * os.path.getsize(paths[0]), keep=paths[2], suffix=".parquet")
+
+        self.assertListEqual([True, False, True], [os.path.isfile(path) for path in paths])
+
+
+@mock.patch("singer.write_record")
+@mock.patch("tap_s3_csv.s3.download_file", side_effect=mock_download_file)
+@mock.patch("tap_s3_csv.s3.get_object_etag", return_value="etag-1")
+class TestSyncParquetFile(unittest.TestCase):
+
+    stream = {'schema': {'type': 'object', 'properties': {}}, 'metadata': []}
+    table_spec = {'table_name': 'test_table'}
+
+    def test_downloaded_file_is_removed_without_local_cache_dir(self, mocked_get_object_etag, mocked_download_file, mocked_write_record):
+        config = {'bucket': 'bucket'}
+
+        records = sync.sync_parquet_file(config, None, "unittest_parquet_files/sync.parquet", self.table_spec, self.stream)
+
+        self.assertEqual(10, records)
+        local_path = mocked_download_file.call_args[0][3]
+        self.assertFalse(os.path.exists(local_path))
+        mocked_get_object_etag.assert_not_called()
+
+    def test_downloaded_file_is_kept_in_local_cache_dir(self, mocked_get_object_etag, mocked_download_file, mocked_write_record):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            config = {'bucket': 'bucket', 'local_cache_dir': cache_dir}
+
+            records = sync.sync_parquet_file(config, None, "unittest_parquet_files/sync.parquet", self.table_spec, self.stream)
+
+            self.assertEqual(10, records)
+            self.assertEqual(1, len(os.listdir(cache_dir)))
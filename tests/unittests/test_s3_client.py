@@ -0,0 +1,46 @@
+import unittest
+from unittest import mock
+from tap_s3_csv import s3
+
+
+@mock.patch("boto3.session.Session")
+class TestS3ClientCache(unittest.TestCase):
+
+    def setUp(self):
+        s3.get_aws_session.cache_clear()
+        s3.get_cached_s3_client.cache_clear()
+
+    def tearDown(self):
+        s3.get_aws_session.cache_clear()
+        s3.get_cached_s3_client.cache_clear()
+
+    def test_client_is_reused_for_same_credentials(self, mocked_session):
+        config = {'aws_access_key_id': 'key', 'aws_secret_access_key': 'secret'}
+
+        first_client = s3.get_s3_client(config)
+        second_client = s3.get_s3_client(dict(config))
+
+        self.assertIs(first_client, second_client)
+        mocked_session.assert_called_once_with(aws_access_key_id='key', aws_secret_access_key='secret')
+
+    def test_setup_aws_client_shares_the_session_of_the_client(self, mocked_session):
+        config = {'aws_access_key_id': 'key', 'aws_secret_access_key': 'secret'}
+
+        session = s3.setup_aws_client(config)
+        s3.get_s3_client(config)
+
+        self.assertIs(session, mocked_session.return_value)
+        mocked_session.assert_called_once_with(aws_access_key_id='key', aws_secret_access_key='secret')
+
+    def test_new_client_for_other_credentials(self, mocked_session):
+        s3.get_s3_client({'aws_access_key_id': 'key', 'aws_secret_access_key': 'secret'})
+        s3.get_s3_client({'aws_access_key_id': 'other_key', 'aws_secret_access_key': 'secret'})
+
+        self.assertEqual(2, mocked_session.call_count)
+
+
+class TestTransferConfig(unittest.TestCase):
+
+    def test_transfer_concurrency_is_independent_of_download_concurrency(self):
+        self.assertEqual(16, s3.get_transfer_config({'s3_download_concurrency': 2}).max_concurrency)
+        self.assertEqual(4, s3.get_transfer_config({'s3_transfer_concurrency': 4}).max_concurrency)
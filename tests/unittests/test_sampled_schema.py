@@ -2,12 +2,12 @@ import unittest
 from unittest import mock
 from tap_s3_csv import s3
 
-def mock_empty_sample_files(config, table_spec, s3_files_gen):
+def mock_empty_sample_files(config, table_spec, s3_files_gen, stats=None):
     samples = []
     for sample in samples:
         yield sample
 
-def mock_valid_sample_files(config, table_spec, s3_files_gen):
+def mock_valid_sample_files(config, table_spec, s3_files_gen, stats=None):
     samples = [{'id': 1, 'name': 'Bob'}, {'id': 2, 'name': 'Alice'}]
     for sample in samples:
         yield sample
@@ -80,3 +80,16 @@ class TestGetSampledSchema(unittest.TestCase):
         }
 
         self.assertEqual(returned_schema, expected_schema)
+
+
+class TestMergeDicts(unittest.TestCase):
+
+    def test_merge_nested_dicts(self):
+        first = {'a': {'b': {'c': 1, 'd': 2}, 'e': 3}, 'f': 4}
+        second = {'a': {'b': {'d': 5}, 'g': 6}, 'f': {'h': 7}}
+
+        merged = s3.merge_dicts(first, second)
+
+        self.assertEqual({'a': {'b': {'c': 1, 'd': 5}, 'e': 3, 'g': 6}, 'f': {'h': 7}}, merged)
+        # The inputs are left untouched
+        self.assertEqual({'a': {'b': {'c': 1, 'd': 2}, 'e': 3}, 'f': 4}, first)